@@ -14,11 +14,14 @@ software, e.g. TagSpaces.
 Usage
 -----
 autotagical [-h] [-V] [-C <config file>] [-H] [-i <input path>]
-            [-I <ignore file>] [-R] [-o <output path>] [-O]
+            [-I <ignore file>] [-R] [--scanthreads <threads>]
+            [-o <output path>] [-O] [--outputstrategy <strategy>]
+            [--movethreads <threads>] [--chunksize <KiB>]
             [-g <tag group file>] [-s <schema file>] [-A] [--cleanin]
-            [--cleanout] [-c] [-F] [-k] [-m] [-M] [-n] [-N] [-t]
-            [--debug] [-l <log file>] [-L] [-P] [-q] [-v] [--force]
-            [--yes]
+            [--cleanout] [-c] [-F] [--incremental]
+            [--iterorder <order>] [-k] [-m] [-M] [-n] [-N]
+            [--processes <processes>] [--stream] [-t] [--debug]
+            [-l <log file>] [-L] [-P] [-q] [-v] [--force] [--yes]
 """
 
 __version__ = '1.1.0'  # Define the current version
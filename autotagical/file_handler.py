@@ -8,18 +8,88 @@ This is 'autotagical.file_handler'.
 It contains the various functions and classes used to handle finding files,
 moving them, etc. in autotagical
 
+---------
+Constants
+---------
+OUTPUT_STRATEGIES
+    The ways files may be produced in output folders after the first.
+COPY_CHUNK_SIZE
+    The default number of bytes to copy at a time.
+SCAN_LOOKAHEAD
+    The number of folders concurrent scanning may list ahead of the files
+    being yielded.
+_FICLONE
+    Linux ioctl request for cloning a file's data (reflinking).
+_COPY_FALLBACK_ERRNOS
+    Error numbers meaning a way of copying data is unsupported, so the next
+    should be tried.
+
 ---------
 Functions
 ---------
+_list_folder(folder_path, recurse=False, process_hidden=False)
+    Lists the files in a single folder, as well as the subfolders to descend
+    into if recursing.
+_walk_files(folder_path, process_hidden=False)
+    Recursively yields directory entries for all files in a folder, in the
+    same order os.walk() would visit them.
+_scan_task(executor, folder_path, recurse=False, process_hidden=False,
+           budget=None)
+    Lists a single folder in a worker thread, submitting the listing of its
+    subfolders to the same executor while within budget.
+_collect_scan(executor, future, recurse=False, process_hidden=False,
+              budget=None, reserved=False)
+    Yields the directory entries found by a _scan_task() and all the tasks it
+    spawned, in serial scan order.
+_scan_folders(input_folders, recurse=False, process_hidden=False,
+              scan_threads=1, failed=None)
+    Yields directory entries for all files in several folders, in order,
+    listing directories concurrently if told to.
+_entry_stat(entry)
+    Returns the (cached) stat() result of a directory entry, or None if it
+    cannot be stat'ed.
+_entry_device(entry)
+    Returns the device (st_dev) of a directory entry itself, if known from
+    its cached stat() result.
+_device_of(path)
+    Returns the device (st_dev) of the filesystem a path is (or would be
+    created) on.
+_find_literals(parsed, literals)
+    Adds the characters every match of a parsed regex must contain to a set.
+required_literals(pattern)
+    Returns the characters every (full) match of a compiled regex must
+    contain.
 clean_folder(folder_path, trial_run=False):
     Removes all empty directories/subdirectories from the specified folder.
 check_windows_compat(name, full_path)
     Checks a file name and path for Windows-unsafe characters.
 check_output_location(settings)
     Checks output folder locations to ensure that they are ready for output.
-move_file_to_folder(out_folder, file, settings)
-    Copies a file to the specified output folder, handling potential
-    clobbering etc.
+_copy_data(source_fd, destination_fd, chunk_size=COPY_CHUNK_SIZE)
+    Copies all remaining data between two file descriptors, in the kernel if
+    possible.
+copy_file(source, destination, chunk_size=COPY_CHUNK_SIZE)
+    Copies a file's data and metadata, like shutil.copy2(), but without
+    passing the data through Python where possible.
+_transfer_file(source, destination, strategy='copy',
+               chunk_size=COPY_CHUNK_SIZE)
+    Produces a file at destination from an existing file, by copying,
+    hardlinking, reflinking, or symlinking it.
+_prepare_move(out_folder, file, settings, known_folders=None)
+    Makes all checks (and asks all questions) necessary before moving a file
+    to the specified output folder, without touching the file itself.
+_transfer_to(full_out_path, file, settings, rename=False, primary=None,
+             out_stat=None)
+    Actually copies (or renames) a file to a path prepared by _prepare_move().
+move_file_to_folder(out_folder, file, settings, rename=False, primary=None)
+    Copies (or renames) a file to the specified output folder, handling
+    potential clobbering etc.
+_move_file_job(file, targets, settings)
+    Moves a file to all the paths prepared for it, then removes the original
+    if appropriate.
+_paths_conflict(paths, other_paths)
+    Determines whether any of two collections of paths are the same or inside
+    one another.
 move_files(move_list, settings)
     Moves/renames files according to a provided list.
 
@@ -37,8 +107,407 @@ AutotagicalFileHandler
 import os
 import shutil
 import re
+import stat
 import sys
+import errno
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # pylint: disable=C0103
+try:
+    # pylint: disable=E0611
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
+from autotagical.groups import combine_regexes
+from autotagical.tags import TAG_DICTIONARY
+
+# Ways files may be produced in output folders after the first
+OUTPUT_STRATEGIES = ('copy', 'hardlink', 'reflink', 'symlink')
+# Linux ioctl request for cloning a file's data (reflinking)
+_FICLONE = 0x40049409
+# Default number of bytes to copy at a time
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+# Number of folders concurrent scanning may list ahead of the files yielded
+SCAN_LOOKAHEAD = 256
+# Errors meaning a way of copying is unsupported, so the next should be tried
+_COPY_FALLBACK_ERRNOS = frozenset([errno.EXDEV, errno.ENOSYS, errno.EINVAL,
+                                   errno.EOPNOTSUPP, errno.ENOTSOCK,
+                                   errno.EBADF, errno.ETXTBSY])
+
+
+def _list_folder(folder_path, recurse=False, process_hidden=False):
+    """
+    Lists the files in a single folder, as well as the subfolders to descend
+    into if recursing.  Shared by serial and concurrent scanning, so that both
+    find exactly the same files.
+
+    Parameters
+    ----------
+    folder_path: str
+        Path to folder to list.
+    recurse: bool
+        If True, everything that is not a directory is a file (as with
+        os.walk()) and subfolders are returned.  Otherwise, only regular files
+        (and symlinks to them) are files and no subfolders are returned.
+    process_hidden: bool
+        If True, will include files and subfolders beginning with '.'
+
+    Returns
+    -------
+    (files, subfolders): (list of os.DirEntry, list of str)
+        files: list of os.DirEntry
+            Entries for the files in the folder, in scandir() order.
+        subfolders: list of str
+            Paths to the subfolders to descend into, in scandir() order.
+
+    Raises
+    ------
+    OSError
+        If the folder cannot be read.
+    """
+    with os.scandir(folder_path) as scanned:
+        entries = list(scanned)
+    files = []
+    subfolders = []
+    for entry in entries:
+        if not process_hidden and entry.name.startswith('.'):
+            continue
+        if not recurse:
+            if entry.is_file():
+                files.append(entry)
+            continue
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            is_dir = False
+        if not is_dir:
+            files.append(entry)
+        # Like os.walk(), do not follow symlinks to directories
+        elif not entry.is_symlink():
+            subfolders.append(entry.path)
+    return (files, subfolders)
+
+
+def _walk_files(folder_path, process_hidden=False):
+    """
+    Recursively yields directory entries for all files in a folder, in the
+    same order os.walk() would visit them.  Unlike os.walk(), this exposes the
+    os.DirEntry objects, so that their cached stat() results may be used.
+
+    Parameters
+    ----------
+    folder_path: str
+        Path to folder to walk.
+    process_hidden: bool
+        If True, will yield files beginning with '.' and descend into
+        directories beginning with '.'
+
+    Returns
+    -------
+    generator of os.DirEntry
+        Entries for every non-directory in the folder and its subfolders.
+    """
+    # Like os.walk(), silently skip directories that cannot be read
+    try:
+        files, subfolders = _list_folder(folder_path, True, process_hidden)
+    except OSError:
+        return
+    yield from files
+    # Files in a folder are visited before any of its subfolders
+    for subfolder in subfolders:
+        yield from _walk_files(subfolder, process_hidden)
+
+
+def _scan_task(executor, folder_path, recurse=False, process_hidden=False,
+               budget=None):
+    """
+    Lists a single folder in a worker thread, immediately submitting the
+    listing of its subfolders to the same executor (as long as budget allows),
+    and stat()s every file found so that the result is cached for the main
+    thread.
+
+    Parameters
+    ----------
+    executor: concurrent.futures.Executor
+        The executor to submit subfolder listings to.
+    folder_path: str
+        Path to folder to list.
+    recurse: bool
+        If True, subfolders are listed too.  Unreadable folders are then
+        silently skipped (like os.walk()); otherwise errors are raised.
+    process_hidden: bool
+        If True, will include files and subfolders beginning with '.'
+    budget: threading.Semaphore or None (default None)
+        If given, one is acquired (without waiting) for each subfolder listing
+        submitted, and released by _collect_scan() once its files have been
+        yielded.  Subfolders are left to be listed later once it runs out, so
+        that listings do not run ever further ahead of the files being used.
+
+    Returns
+    -------
+    (files, subfolders): (list of os.DirEntry, list of (Future or str))
+        files: list of os.DirEntry
+            Entries for the files in the folder, in scandir() order.
+        subfolders: list of (Future or str)
+            Futures for the listings of each subfolder, or the paths of those
+            not yet submitted, in scandir() order.
+    """
+    try:
+        files, subfolders = _list_folder(folder_path, recurse, process_hidden)
+    except OSError:
+        if recurse:
+            return ([], [])
+        raise
+    subfolders = [executor.submit(_scan_task, executor, subfolder, recurse,
+                                  process_hidden, budget)
+                  if budget is None or budget.acquire(blocking=False)
+                  else subfolder for subfolder in subfolders]
+    for entry in files:
+        _entry_stat(entry)
+    return (files, subfolders)
+
+
+# pylint: disable=too-many-arguments
+def _collect_scan(executor, future, recurse=False, process_hidden=False,
+                  budget=None, reserved=False):
+    """
+    Yields the directory entries found by a _scan_task() and all the tasks it
+    spawned, in the same order as a serial scan would find them.  Subfolders
+    that were not yet submitted are submitted once they are reached.
+
+    Parameters
+    ----------
+    executor: concurrent.futures.Executor
+        The executor the tasks were submitted to.
+    future: Future
+        The future of the _scan_task() for the top folder.
+    recurse: bool
+        As given to _scan_task().
+    process_hidden: bool
+        As given to _scan_task().
+    budget: threading.Semaphore or None (default None)
+        As given to _scan_task().
+    reserved: bool (default False)
+        Whether one of budget was acquired for the top folder, to be released
+        once its files are yielded.
+
+    Returns
+    -------
+    generator of os.DirEntry
+        Entries for every file found.  Raises whatever the top task raised.
+    """
+    files, subfolders = future.result()
+    yield from files
+    # Not held on to while subfolders are yielded
+    del files
+    if reserved:
+        budget.release()
+    for subfolder in subfolders:
+        if isinstance(subfolder, str):
+            # Too far ahead to have been listed, so list it now
+            yield from _collect_scan(
+                executor, executor.submit(_scan_task, executor, subfolder,
+                                          recurse, process_hidden, budget),
+                recurse, process_hidden, budget)
+        else:
+            yield from _collect_scan(executor, subfolder, recurse,
+                                     process_hidden, budget, True)
+
+
+def _scan_folders(input_folders, recurse=False, process_hidden=False,
+                  scan_threads=1, failed=None):
+    """
+    Yields directory entries for all files in several folders, in the same
+    order as scanning each folder in turn would.  If scan_threads is more
+    than 1, directories are listed concurrently in a pool of threads, at most
+    SCAN_LOOKAHEAD folders ahead of the files yielded.
+
+    Parameters
+    ----------
+    input_folders: list of str
+        Paths to folders to scan.
+    recurse: bool
+        If True, will descend into subfolders recursively.
+    process_hidden: bool
+        If True, will yield files beginning with '.' and (if recurse is True)
+        descend into directories beginning with '.'
+    scan_threads: int
+        Number of threads to list directories with.
+    failed: list of str (default None)
+        If given, input folders that could not be scanned are appended to it.
+
+    Returns
+    -------
+    generator of os.DirEntry
+        Entries for every file found.
+    """
+    if scan_threads <= 1:
+        for folder in input_folders:
+            try:
+                if recurse:
+                    # If scanning recursively, walk all subfolders
+                    yield from _walk_files(folder, process_hidden)
+                else:
+                    # If not scanning recursively, only list the folder itself
+                    yield from _list_folder(folder, False, process_hidden)[0]
+            except FileNotFoundError as err:
+                logging.error('Error with input folder: %s', str(err))
+                if failed is not None:
+                    failed.append(folder)
+        return
+
+    budget = threading.Semaphore(SCAN_LOOKAHEAD)
+    with ThreadPoolExecutor(max_workers=scan_threads) as executor:
+        # Start scanning all folders at once...
+        futures = [(folder, executor.submit(_scan_task, executor, folder,
+                                            recurse, process_hidden, budget))
+                   for folder in input_folders]
+        # ...but yield files in order as results come in
+        for folder, future in futures:
+            try:
+                yield from _collect_scan(executor, future, recurse,
+                                         process_hidden, budget)
+            except FileNotFoundError as err:
+                logging.error('Error with input folder: %s', str(err))
+                if failed is not None:
+                    failed.append(folder)
+
+
+def _entry_stat(entry):
+    """
+    Returns the (cached) stat() result of a directory entry, or None if it
+    cannot be stat'ed.
+
+    Parameters
+    ----------
+    entry: os.DirEntry
+        The entry to stat.
+
+    Returns
+    -------
+    os.stat_result or None
+        The stat result, or None if it could not be determined.
+    """
+    try:
+        return entry.stat()
+    except OSError:
+        return None
+
+
+def _entry_device(entry):
+    """
+    Returns the device (st_dev) of a directory entry itself, if known from
+    its cached stat() result.  That is the result of following symlinks, so
+    the device of a symlink is never known.
+
+    Parameters
+    ----------
+    entry: os.DirEntry
+        The entry to check.
+
+    Returns
+    -------
+    int or None
+        The device of the entry, or None if it is a symlink or its device
+        could not be determined (e.g. on Windows, where cached stat() results
+        have none).
+    """
+    try:
+        if entry.is_symlink():
+            return None
+        stat_result = entry.stat()
+    except OSError:
+        return None
+    return stat_result.st_dev if stat_result.st_ino else None
+
+
+def _device_of(path):
+    """
+    Returns the device (st_dev) of the filesystem a path is on.  If the path
+    does not exist (yet), the device of its nearest existing ancestor is used,
+    as that is where it would be created.
+
+    Parameters
+    ----------
+    path: str
+        The path to check.
+
+    Returns
+    -------
+    int or None
+        The device of the path, or None if it could not be determined.
+    """
+    path = os.path.abspath(path)
+    while True:
+        try:
+            return os.stat(path).st_dev
+        except FileNotFoundError:
+            parent = os.path.dirname(path)
+            if parent == path:
+                return None
+            path = parent
+        except OSError:
+            return None
+
+
+def _find_literals(parsed, literals):
+    """
+    Adds the characters every match of a parsed regex must contain to a set,
+    by descending into everything that must match at least once.
+
+    Parameters
+    ----------
+    parsed: sre_parse.SubPattern or list
+        The parsed regex (or part of one).
+    literals: set of str
+        The set to add the characters to.
+
+    Returns
+    -------
+    None
+    """
+    for opcode, argument in parsed:
+        if opcode is sre_parse.LITERAL:
+            literals.add(chr(argument))
+        elif opcode is sre_parse.SUBPATTERN:
+            # Case-insensitive literals need not appear as written
+            if not argument[1] & sre_parse.SRE_FLAG_IGNORECASE:
+                _find_literals(argument[-1], literals)
+        elif opcode in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+            if argument[0] >= 1:
+                _find_literals(argument[2], literals)
+
+
+def required_literals(pattern):
+    """
+    Returns the characters every (full) match of a compiled regex must
+    contain, e.g. '[' and ']' for TagSpaces-style tags.  Names that lack any
+    of them cannot match, so may be rejected without running the regex.
+
+    Parameters
+    ----------
+    pattern: re.Pattern
+        The compiled regex.
+
+    Returns
+    -------
+    frozenset of str
+        The characters, which may be empty if none are certain.
+    """
+    if pattern.flags & re.IGNORECASE or not isinstance(pattern.pattern, str):
+        return frozenset()
+    literals = set()
+    try:
+        _find_literals(sre_parse.parse(pattern.pattern, pattern.flags),
+                       literals)
+    except Exception:  # pylint: disable=W0703
+        # Never worth failing over; just don't prefilter
+        return frozenset()
+    return frozenset(literals)
 
 
 def clean_folder(folder_path, trial_run=False):
@@ -141,10 +610,177 @@ def check_output_location(settings):
     return True
 
 
-def move_file_to_folder(out_folder, file, settings):
+def _copy_data(source_fd, destination_fd, chunk_size=COPY_CHUNK_SIZE):
     """
-    Copies a file to the specified output folder, handling potential
-    clobbering etc.
+    Copies all remaining data between two file descriptors.  Tries
+    os.copy_file_range() (which may not even need to read the data, e.g. on
+    NFS or copy-on-write filesystems), then os.sendfile() (which at least
+    keeps the data in the kernel), and finally falls back to plain reads and
+    writes.  Each continues where the previous one left off.  If either of the
+    first two copies nothing at all, the next is tried, as some files (e.g. in
+    procfs or sysfs) and filesystems report no data to them rather than an
+    error.
+
+    Parameters
+    ----------
+    source_fd: int
+        File descriptor to read from, from its current offset.
+    destination_fd: int
+        File descriptor to write to, from its current offset.
+    chunk_size: int (default COPY_CHUNK_SIZE)
+        Maximum number of bytes to copy at a time.
+
+    Returns
+    -------
+    None
+
+    Raises
+    ------
+    OSError
+        If copying fails.
+    """
+    if hasattr(os, 'copy_file_range'):
+        try:
+            copied = os.copy_file_range(source_fd, destination_fd, chunk_size)
+            # Nothing copied may mean unsupported rather than empty
+            if copied:
+                while os.copy_file_range(source_fd, destination_fd,
+                                         chunk_size):
+                    pass
+                return
+        except OSError as err:
+            if err.errno not in _COPY_FALLBACK_ERRNOS:
+                raise
+    if hasattr(os, 'sendfile'):
+        # Unlike copy_file_range(), sendfile() does not advance the source
+        start = offset = os.lseek(source_fd, 0, os.SEEK_CUR)
+        try:
+            while True:
+                sent = os.sendfile(destination_fd, source_fd, offset,
+                                   chunk_size)
+                if not sent:
+                    # As above, nothing sent may mean unsupported rather than
+                    # empty
+                    if offset != start:
+                        return
+                    break
+                offset += sent
+        except OSError as err:
+            if err.errno not in _COPY_FALLBACK_ERRNOS:
+                raise
+            os.lseek(source_fd, offset, os.SEEK_SET)
+    while True:
+        chunk = memoryview(os.read(source_fd, chunk_size))
+        if not chunk:
+            return
+        # Writes may be partial
+        while chunk:
+            chunk = chunk[os.write(destination_fd, chunk):]
+
+
+def copy_file(source, destination, chunk_size=COPY_CHUNK_SIZE):
+    """
+    Copies a file's data and metadata, like shutil.copy2(), but without
+    passing the data through Python where possible (see _copy_data()).
+
+    Parameters
+    ----------
+    source: str
+        Path to the file to copy (symlinks are followed).
+    destination: str
+        Path to the file to copy to.  Anything already there is overwritten.
+    chunk_size: int (default COPY_CHUNK_SIZE)
+        Maximum number of bytes to copy at a time.
+
+    Returns
+    -------
+    None
+
+    Raises
+    ------
+    OSError
+        If copying fails (shutil.SameFileError if source and destination are
+        the same file).
+    """
+    if os.path.exists(destination) and os.path.samefile(source, destination):
+        raise shutil.SameFileError(source + ' and ' + destination +
+                                   ' are the same file.')
+    with open(source, 'rb') as source_file, \
+            open(destination, 'wb') as destination_file:
+        _copy_data(source_file.fileno(), destination_file.fileno(),
+                   chunk_size)
+    shutil.copystat(source, destination)
+
+
+def _transfer_file(source, destination, strategy='copy',
+                   chunk_size=COPY_CHUNK_SIZE):
+    """
+    Produces a file at destination from an existing file, by copying,
+    hardlinking, reflinking, or symlinking it.  If the chosen strategy is not
+    possible (e.g. the destination is on a different filesystem), the file is
+    copied instead.
+
+    Parameters
+    ----------
+    source: str
+        Path to the existing file.
+    destination: str
+        Path to produce the file at.  Anything already there is overwritten.
+    strategy: str (default 'copy')
+        One of OUTPUT_STRATEGIES:
+            'copy': Copy the file and its metadata (copy_file()).
+            'hardlink': Hardlink the file.
+            'reflink': Clone the file's data copy-on-write (Linux FICLONE)
+            'symlink': Symlink to the absolute path of the file.
+    chunk_size: int (default COPY_CHUNK_SIZE)
+        Maximum number of bytes to copy at a time, if copying.
+
+    Returns
+    -------
+    None
+
+    Raises
+    ------
+    OSError
+        If even copying fails.
+    """
+    if strategy != 'copy':
+        try:
+            if os.path.lexists(destination):
+                # Do not remove the very file to be linked to
+                if os.path.samefile(source, destination):
+                    raise shutil.SameFileError(source + ' and ' + destination
+                                               + ' are the same file.')
+                # Links cannot be created over existing files
+                if strategy != 'reflink':
+                    os.remove(destination)
+            if strategy == 'hardlink':
+                os.link(source, destination)
+            elif strategy == 'symlink':
+                os.symlink(os.path.abspath(source), destination)
+            elif strategy == 'reflink':
+                if fcntl is None:
+                    raise OSError('Reflinks are not supported on this '
+                                  'platform.')
+                with open(source, 'rb') as source_file, \
+                        open(destination, 'wb') as destination_file:
+                    fcntl.ioctl(destination_file.fileno(), _FICLONE,
+                                source_file.fileno())
+                shutil.copystat(source, destination)
+            else:
+                raise ValueError('Unknown output strategy: ' + str(strategy))
+            return
+        except OSError as err:
+            logging.info('Could not %s file to: %s, copying instead:\n%s',
+                         strategy, destination, str(err))
+    copy_file(source, destination, chunk_size)
+
+
+def _prepare_move(out_folder, file, settings, known_folders=None):
+    """
+    Makes all checks (and asks all questions) necessary before moving a file
+    to the specified output folder and creates the destination folder, but
+    does not touch the file itself.  Clobbered directories are removed.
 
     Parameters
     ----------
@@ -154,11 +790,19 @@ def move_file_to_folder(out_folder, file, settings):
         The file being moved.
     settings: AutotagicalSettings
         The settings to execute the move using.
+    known_folders: set of str (default None)
+        Folders known to exist (e.g. created for earlier files), which need
+        not be checked again.  Updated with folders created or removed.
 
     Returns
     -------
-    bool
-        True if the file was actually moved, False otherwise.
+    (full_out_path, out_stat): (str, os.stat_result or None), or None
+        full_out_path: str
+            The full path to move the file to.
+        out_stat: os.stat_result or None
+            The result of stat() on whatever is at full_out_path, or None if
+            nothing is (any longer).
+        None is returned instead if the file should not be moved.
     """
     # Determine paths
     full_out_path = os.path.join(out_folder, file.dest_folder,
@@ -174,65 +818,272 @@ def move_file_to_folder(out_folder, file, settings):
        os.path.normpath(os.path.normcase(file.original_path)):
         logging.info('Skipping moving file onto itself at: %s',
                      file.original_path)
-        return False
+        return None
     logging.info('Moving/renaming file:\nFrom: ' + file.original_path +
                  '\nTo: ' + full_out_path)
 
     # Create the destination folder if it doesn't exist
-    if not os.path.exists(out_dir):
-        logging.info('Creating destination folder: %s', out_dir)
-        if not settings.trial_run:
-            os.makedirs(out_dir)
-
-    # Check for clobber
-    if os.path.exists(full_out_path):
+    if known_folders is None or out_dir not in known_folders:
+        if not os.path.exists(out_dir):
+            logging.info('Creating destination folder: %s', out_dir)
+            if not settings.trial_run:
+                os.makedirs(out_dir)
+        if known_folders is not None:
+            known_folders.add(out_dir)
+
+    # Check for clobber (with a single stat)
+    try:
+        out_stat = os.stat(full_out_path)
+    except OSError:
+        out_stat = None
+    if out_stat is not None:
         # If it's a dir, have to remove it
-        if os.path.isdir(full_out_path):
+        if stat.S_ISDIR(out_stat.st_mode):
             # Remove if told to clobber (by settings or user)
             if ((settings.clobber or
                  settings.get_yes_no('Directory exists at: ' +
                                      full_out_path +
                                      '\nOverwrite with file?', False))
                     and not settings.trial_run):
+                # Folders in it will no longer exist
+                if known_folders:
+                    known_folders.difference_update(
+                        [folder for folder in known_folders
+                         if folder == full_out_path or
+                         folder.startswith(full_out_path + os.sep)])
                 try:
                     shutil.rmtree(full_out_path)
                 except (OSError, FileNotFoundError) as err:
                     logging.error('Error removing directory at: %s\n%s',
                                   full_out_path, str(err))
                     logging.error('Skipping moving file to: %s', full_out_path)
-                    return False
+                    return None
+                out_stat = None
             else:
                 logging.warning('Skipping to avoid clobbering.')
-                return False
+                return None
         # Otherwise, skip if not told to clobber (by settings and user input)
         elif (not settings.clobber
               and not settings.get_yes_no('File exists at: ' + full_out_path +
                                           '\nOverwrite?', False)):
             logging.warning('Skipping to avoid clobbering.')
-            return False
+            return None
         logging.warning('Overwriting file.')
+    return (full_out_path, out_stat)
+
 
+def _transfer_to(full_out_path, file, settings, rename=False, primary=None,
+                 out_stat=None):
+    """
+    Actually copies (or renames) a file to a path prepared by
+    _prepare_move().  This never asks the user anything, so it may be run in
+    a worker thread.
+
+    Parameters
+    ----------
+    full_out_path: str
+        The full path to move the file to.
+    file: AutotagicalFile
+        The file being moved.
+    settings: AutotagicalSettings
+        The settings to execute the move using.
+    rename: bool (default False)
+        If True, the original file is renamed into place rather than copied,
+        so it will no longer exist afterwards.  If renaming fails (e.g. the
+        output is on another filesystem after all), the file is copied and
+        the original removed instead.
+    primary: str (default None)
+        Path to a copy of the file already placed in another output folder.
+        If given, the file is produced from it according to
+        settings.output_strategy (see _transfer_file()) instead of copied
+        from the original.
+    out_stat: os.stat_result (default None)
+        The result of stat() on whatever is at full_out_path, as returned by
+        _prepare_move(), or None if nothing is there.
+
+    Returns
+    -------
+    bool
+        True if the file was actually moved, False otherwise.
+    """
     # Actually move the file (if not trial)
     if not settings.trial_run:
+        # Renaming is atomic and involves no copying at all, so try it first
+        if rename:
+            # Renaming onto another link to the same file does nothing at
+            # all, so the original would be removed with no copy left.  Only
+            # a file with several links can be one.
+            if out_stat is not None and out_stat.st_nlink > 1:
+                try:
+                    same_file = os.path.samestat(
+                        os.stat(file.original_path), out_stat)
+                except OSError:
+                    same_file = False
+                if same_file:
+                    logging.error('File at: %s\nis already a link to: %s',
+                                  full_out_path, file.original_path)
+                    logging.error('Skipping moving file to: %s',
+                                  full_out_path)
+                    return False
+            try:
+                os.replace(file.original_path, full_out_path)
+                return True
+            except OSError as err:
+                logging.info('Could not rename file, copying instead:\n%s',
+                             str(err))
         try:
-            shutil.copy2(file.original_path, full_out_path)
+            chunk_size = getattr(settings, 'copy_chunk_size',
+                                 COPY_CHUNK_SIZE)
+            if primary is None:
+                copy_file(file.original_path, full_out_path, chunk_size)
+            else:
+                _transfer_file(primary, full_out_path,
+                               getattr(settings, 'output_strategy', 'copy'),
+                               chunk_size)
         except (OSError, FileNotFoundError) as err:
             logging.error('Error copying file to: %s\n%s', full_out_path,
                           str(err))
             logging.error('Skipping moving file to: %s', full_out_path)
             return False
+        # The original is expected to be gone after renaming
+        if rename:
+            logging.info('Removing original file at: %s', file.original_path)
+            os.remove(file.original_path)
     return True
 
 
+def move_file_to_folder(out_folder, file, settings, rename=False,
+                        primary=None):
+    """
+    Copies (or renames) a file to the specified output folder, handling
+    potential clobbering etc.
+
+    Parameters
+    ----------
+    out_folder: str
+        The root folder to move to.
+    file: AutotagicalFile
+        The file being moved.
+    settings: AutotagicalSettings
+        The settings to execute the move using.
+    rename: bool (default False)
+        If True, the original file is renamed into place rather than copied,
+        so it will no longer exist afterwards.  Should only be used for the
+        last output folder, when not keeping originals.  If renaming fails
+        (e.g. the output is on another filesystem after all), the file is
+        copied and the original removed instead.
+    primary: str (default None)
+        Path to a copy of the file already placed in another output folder.
+        If given, the file is produced from it according to
+        settings.output_strategy (see _transfer_file()) instead of copied
+        from the original.
+
+    Returns
+    -------
+    bool
+        True if the file was actually moved, False otherwise.
+    """
+    prepared = _prepare_move(out_folder, file, settings)
+    if prepared is None:
+        return False
+    full_out_path, out_stat = prepared
+    return _transfer_to(full_out_path, file, settings, rename, primary,
+                        out_stat)
+
+
+def _move_file_job(file, targets, settings):
+    """
+    Moves a file to all the paths prepared for it by _prepare_move(), in
+    order, then removes the original if appropriate.  This never asks the
+    user anything, so it may be run in a worker thread.
+
+    Parameters
+    ----------
+    file: AutotagicalFile
+        The file being moved.
+    targets: list of (str, bool, os.stat_result or None)
+        The full paths to move the file to, each with whether the original
+        should be renamed there and the result of stat() on whatever is
+        already there (see _transfer_to()).  The first successful
+        one becomes the primary copy that all later ones are produced from.
+    settings: AutotagicalSettings
+        The settings to execute the move using.
+
+    Returns
+    -------
+    None
+    """
+    # Don't set this until file has been moved, so it is not deleted without
+    # moving
+    moved = False
+    # Set if the original was renamed into place, so is already gone
+    renamed = False
+    # The first full copy of the file placed in an output folder, which all
+    # further output folders are copied (or linked) from.
+    primary = None
+
+    # Copy file to each output folder
+    for full_out_path, rename, out_stat in targets:
+        # Move the file
+        did_move = _transfer_to(full_out_path, file, settings, rename,
+                                primary, out_stat)
+
+        # If it was successfully moved, then make note of it
+        if not moved and did_move:
+            moved = True
+            primary = full_out_path
+        if rename and did_move and not settings.trial_run:
+            renamed = True
+
+    # Now that it's been copied everywhere, remove the file (unless keeping or
+    # didn't move or it was already renamed away)
+    if not settings.copy and moved and not renamed:
+        # Only remove original if it was successfully moved
+        logging.info('Removing original file at: %s', file.original_path)
+        if not settings.trial_run:
+            os.remove(file.original_path)
+
+
+def _paths_conflict(paths, other_paths):
+    """
+    Determines whether any of two collections of (normalized, absolute) paths
+    are the same or inside one another.
+
+    Parameters
+    ----------
+    paths: iterable of str
+        The first paths.
+    other_paths: iterable of str
+        The other paths.
+
+    Returns
+    -------
+    bool
+        True if any paths conflict, False otherwise.
+    """
+    for path in paths:
+        for other_path in other_paths:
+            if path == other_path or \
+               path.startswith(other_path + os.sep) or \
+               other_path.startswith(path + os.sep):
+                return True
+    return False
+
+
 def move_files(move_list, settings):
     """
-    Moves/renames files according to a provided list.
+    Moves/renames files according to a provided list.  If
+    settings.move_threads is more than 1, files are transferred concurrently
+    in that many threads, but all checks and prompts still happen in order in
+    the calling thread, before any file at a conflicting path is touched.
 
     Parameters
     ----------
-    move_list: list of AutotagicalFile
+    move_list: list of AutotagicalFile or iterable of AutotagicalFile
         A list of AutotagicalFile objects, each representing a file to be
-        moved/renamed.
+        moved/renamed.  It may be any other iterable (e.g. a generator), in
+        which case files are moved as they arrive.  Either way, destination
+        folders are only created once a file is moved into them.
     settings: AutotagicalSettings
         An AutotagicalSettings object holding the settings for the movement.
 
@@ -245,48 +1096,119 @@ def move_files(move_list, settings):
         logging.error('Aborting due to bad output folder location.')
         sys.exit()
 
-    # Iterate through files
-    for file in move_list:
-        # Unless told to move everything, warn about files that don't match
-        if not settings.all_match_root and file.move_failed:
-            logging.warning('Skipping file, as it failed to match any '
-                            'movement schema: %s',
-                            file.raw_name)
-            continue
-
-        # Unless told to move all, only move if file was renamed
-        if not settings.force_move and file.rename_failed:
-            logging.warning('Skipping file as it could not be renamed: %s',
-                            file.raw_name)
-            continue
-
-        # Don't set this until file has been moved, so it is not deleted
-        # without moving
-        moved = False
-
-        # Copy file to each output folder
-        for out_folder in settings.output_folders:
-            # Move the file
-            did_move = move_file_to_folder(out_folder, file, settings)
-
-            # If it was successfully moved, then make note of it
-            if not moved and did_move:
-                moved = True
-
-        # Now that it's been copied everywhere, remove the file (unless keeping
-        # or didn't move)
-        if not settings.copy and moved:
-            # Only remove original if it was successfully moved
-            logging.info('Removing original file at: %s', file.original_path)
-            if not settings.trial_run:
-                os.remove(file.original_path)
+    # Devices of output folders, to know when files can simply be renamed
+    out_devices = [_device_of(out_folder)
+                   for out_folder in settings.output_folders]
+
+    # Destination folders are created as files are first moved into them,
+    # then remembered, so that they need not be checked for every file.
+    known_folders = set()
+
+    move_threads = getattr(settings, 'move_threads', 1)
+    executor = None
+    if move_threads > 1:
+        executor = ThreadPoolExecutor(max_workers=move_threads)
+    # Jobs submitted but not known to be done, with the paths they touch.
+    # Bounded, so that checking for conflicts stays cheap.
+    in_flight = dict()
+    max_in_flight = 4 * move_threads
+
+    try:
+        # Iterate through files
+        for file in move_list:
+            # Unless told to move everything, warn about files that don't
+            # match
+            if not settings.all_match_root and file.move_failed:
+                logging.warning('Skipping file, as it failed to match any '
+                                'movement schema: %s',
+                                file.raw_name)
+                continue
+
+            # Unless told to move all, only move if file was renamed
+            if not settings.force_move and file.rename_failed:
+                logging.warning('Skipping file as it could not be renamed: %s',
+                                file.raw_name)
+                continue
+
+            # If not keeping the original, it can be renamed into the last
+            # output folder when that is on the same filesystem (symlinks are
+            # copied as the files they point to, so they are never renamed).
+            # The device is usually known from when the file was found, so
+            # it is only stat'ed here if not.
+            rename_last = False
+            if not settings.copy and out_devices and \
+               out_devices[-1] is not None:
+                source_device = file.source_device
+                if source_device is None:
+                    try:
+                        source_stat = os.lstat(file.original_path)
+                        if not stat.S_ISLNK(source_stat.st_mode):
+                            source_device = source_stat.st_dev
+                    except OSError:
+                        pass
+                rename_last = source_device == out_devices[-1]
+
+            # Output folders in the order to place the file in.  The one it is
+            # renamed into goes first, since the original is gone afterwards.
+            out_folders = list(settings.output_folders)
+            if rename_last:
+                out_folders.insert(0, out_folders.pop())
+
+            # Before checking anything, wait for any job touching the same
+            # paths, so that everything is checked as if moving serially.
+            if in_flight:
+                paths = [os.path.normcase(os.path.abspath(path)) for path in
+                         [file.original_path] +
+                         [os.path.join(out_folder, file.dest_folder,
+                                       file.output_name)
+                          for out_folder in out_folders]]
+                conflicting = [future for future, future_paths
+                               in in_flight.items()
+                               if _paths_conflict(paths, future_paths)]
+                if conflicting:
+                    for future in wait(conflicting).done:
+                        del in_flight[future]
+                        future.result()
+
+            # Check (and prompt) for each output folder
+            targets = []
+            for index, out_folder in enumerate(out_folders):
+                prepared = _prepare_move(out_folder, file, settings,
+                                         known_folders)
+                if prepared is not None:
+                    targets.append((prepared[0], rename_last and index == 0,
+                                    prepared[1]))
+
+            if executor is None:
+                _move_file_job(file, targets, settings)
+                continue
+            # Limit jobs in flight, waiting for (at least) one to finish
+            if len(in_flight) >= max_in_flight:
+                for future in wait(in_flight,
+                                   return_when=FIRST_COMPLETED).done:
+                    del in_flight[future]
+                    future.result()
+            in_flight[executor.submit(_move_file_job, file, targets,
+                                      settings)] = \
+                [os.path.normcase(os.path.abspath(path)) for path in
+                 [file.original_path] + [target[0] for target in targets]]
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
+    # Raise any errors encountered in jobs
+    for future in in_flight:
+        future.result()
 
 
 class AutotagicalFile:  # pylint: disable=R0902
     """
     A representation of a file in autotagical.  Gets passed around between
     AutotagicalFileHandler and the various functions for moving and renaming
-    files.
+    files.  As there may be millions, it is slotted, repeated strings (tags,
+    extensions, and folders) are interned so that files share them (tags via
+    the run-wide TAG_DICTIONARY, along with their IDs), and the
+    original path and output name are not stored separately from the raw
+    name unless they differ from it.
 
     Attributes
     ----------
@@ -306,14 +1228,33 @@ class AutotagicalFile:  # pylint: disable=R0902
         The original file name with tags and extension.
     rename_failed: bool
         True if no applicable renaming schema was found, False otherwise.
+    source_device: int or None
+        The device (st_dev) of the original file itself, if known from when
+        it was found, so that it need not be stat'ed again to decide whether
+        it can be renamed into an output folder.  None if not known or it is
+        a symlink.
     tags: str
         Complete tags on the original file, including any delimiters.
     tag_array: list of str
         List of strings, each a tag on the original file.
+    tag_set: TagSet
+        The tags in tag_array as a set (carrying their IDs in TAG_DICTIONARY
+        as tag_set.ids), for fast membership tests.  It is shared by all files
+        with the same tags.  tag_array is still needed where tag order
+        matters.
+    __path_prefix: str
+        The (interned) part of original_path before its file name, i.e. the
+        folder and separator.
+    __path_name: str or None
+        The file name in original_path, or None if it is raw_name.
+    __output_name: str or None
+        The file name the file is to be renamed to, or None if it is
+        raw_name.
 
     Class Methods
     -------------
-    load_file(name, path, tag_patterns, ignore_patterns)
+    load_file(name, path, tag_patterns, ignore_patterns,
+              tag_literals=None)
         Returns an AutotagicalFile object if the specified file matches a tag
         pattern and does not match any ignore pattern.  Otherwise, returns
         None, indicating the file should be ignored.
@@ -326,6 +1267,11 @@ class AutotagicalFile:  # pylint: disable=R0902
     __repr__()
         Pretty print file info.
     """
+    __slots__ = ('dest_folder', 'extension', 'move_failed', 'name', 'raw_name',
+                 'rename_failed', 'source_device', 'tags', 'tag_array',
+                 'tag_set',
+                 '__path_prefix', '__path_name', '__output_name')
+
     # pylint: disable=R0913
     def __init__(self, name, tags, extension, tag_array, raw_name,
                  original_path):
@@ -350,19 +1296,61 @@ class AutotagicalFile:  # pylint: disable=R0902
             name.
         """
         self.dest_folder = ''  # The folder to move to ('' to move to root)
-        self.extension = extension  # Original file extension
+        self.extension = sys.intern(extension)  # Original file extension
         self.move_failed = False  # True if no applicable movement schema found
         self.name = name  # Original file name less tags and extension
+        self.raw_name = raw_name  # File name with tags and extension
         # Complete path to original, including path and file name
         self.original_path = original_path
-        # File name to move to.  Default to the current one.
-        self.output_name = raw_name
-        self.raw_name = raw_name  # File name with tags and extension
+        # File name to move to.  Default to the current one (without storing
+        # it twice).
+        self.__output_name = None
         # True if no applicable renaming schema was found.
         self.rename_failed = False
+        # Device of the original file itself, if known (set when loaded)
+        self.source_device = None
         # Complete tags on original file, including any delimeters
-        self.tags = tags
-        self.tag_array = tag_array  # List of str, each a tag on the file
+        self.tags = sys.intern(tags)
+        # List of str, each a tag on the file.  The list is the file's own,
+        # but each tag is the canonical copy shared by all files.
+        self.tag_array = [TAG_DICTIONARY.canonical(tag) for tag in tag_array]
+        # Same tags and their IDs, for membership tests
+        self.tag_set = TAG_DICTIONARY.tag_set(self.tag_array)
+
+    @property
+    def original_path(self):
+        """
+        Complete path to original file, including directories and file name.
+        """
+        return self.__path_prefix + (self.raw_name if self.__path_name is None
+                                     else self.__path_name)
+
+    @original_path.setter
+    def original_path(self, original_path):
+        """
+        Stores the folder of the path once for all files in it, and the file
+        name only if it is not raw_name.
+        """
+        path_name = os.path.basename(original_path)
+        self.__path_prefix = sys.intern(
+            original_path[:len(original_path) - len(path_name)])
+        self.__path_name = None if path_name == self.raw_name else path_name
+
+    @property
+    def output_name(self):
+        """
+        The file name the file is to be renamed to (raw_name by default).
+        """
+        return self.raw_name if self.__output_name is None \
+            else self.__output_name
+
+    @output_name.setter
+    def output_name(self, output_name):
+        """
+        Stores the output name only if it is not raw_name.
+        """
+        self.__output_name = None if output_name == self.raw_name \
+            else output_name
 
     def __repr__(self):
         """
@@ -381,7 +1369,8 @@ class AutotagicalFile:  # pylint: disable=R0902
                '  Tag Array: ' + str(self.tag_array) + '\n-----End File-----'
 
     @classmethod
-    def load_file(cls, name, path, tag_patterns, ignore_patterns):
+    def load_file(cls, name, path, tag_patterns, ignore_patterns,
+                  tag_literals=None):
         """
         Returns an AutotagicalFile object if the specified file matches a tag
         pattern and does not match any ignore pattern.  Otherwise, returns
@@ -401,6 +1390,10 @@ class AutotagicalFile:  # pylint: disable=R0902
                 }
         ignore_patterns: list of Regular Expression Objects
             A list of compiled regexes full-matching file patterns to ignore.
+        tag_literals: list of frozenset of str (default None)
+            For each tag pattern, the characters any name it matches must
+            contain (see required_literals()), so that names without them are
+            rejected before running the regex.  None to not prefilter.
 
         Returns
         -------
@@ -413,7 +1406,11 @@ class AutotagicalFile:  # pylint: disable=R0902
         if not name or not path:
             raise OSError('Tried to load blank file!')
         # Check if file matches any known pattern
-        for pattern in tag_patterns:
+        for position, pattern in enumerate(tag_patterns):
+            # Cheaply rule out names missing characters the pattern requires
+            if tag_literals is not None and \
+               not all(char in name for char in tag_literals[position]):
+                continue
             match = pattern['tag_pattern'].fullmatch(name)
             # If the file is tagged
             if match:
@@ -431,7 +1428,7 @@ class AutotagicalFile:  # pylint: disable=R0902
                            tag_array=pattern['tag_split_pattern'].split(
                                match.group('tags')),
                            raw_name=name, original_path=path)
-        # File was untagged, so return Non
+        # File was untagged, so return None
         logging.info('Skipping untagged file: %s', path)
         return None
 
@@ -443,33 +1440,69 @@ class AutotagicalFileHandler:
     Instance Attributes
     -------------------
     __file_list: list of AutotagicalFile
+    __devices: dict of int
+        The devices of loaded files, each mapped to itself, so that files
+        share them.
+    __file_ids: dict
+        A dictionary with file IDs (see __file_id()) as keys and sets of str
+        as values, holding the names each loaded file was loaded under.  Used to
+        detect files that have already been loaded.
+    __raw_names: set of str
+        The raw file names of all loaded files.  Files can only be loaded
+        twice under the same name, so new names need no further checking.
+        Like __file_ids, this grows with every file loaded, including those
+        only streamed.
     __ignore_patterns: list of Regular Expression Objects
         A list of compiled regexes full-matching file patterns to ignore.
+    __ignore_matchers: list of Regular Expression Objects
+        The ignore patterns combined into a single regex, unless they could
+        not be combined without changing what they match.
+    __index: AutotagicalIndex or None
+        An index of files processed by previous runs, which are not loaded
+        again if unchanged.  None if not running incrementally.
     __tag_patterns: list of dict
         List of dictionaries, each of the following form:
             {
                 'tag_pattern': Regular Expression Object,
                 'tag_split_pattern': Regular Expression Object
             }
+    __tag_literals: list of frozenset of str
+        For each tag pattern, the characters any name it matches must contain.
 
     Methods
     -------
-    __init__(tag_formats)
+    __init__(tag_formats, index=None)
         Constructor.  Initialize attributes and compiles tag pattern regexes.
     load_ignore_file(path)
         Loads in ignore patterns in the specified ignore file, appending them
         to known patterns.
-    check_new(self, name, path):
+    __file_id(path, stat_result=None)
+        Returns the (st_dev, st_ino) tuple (or real path, if there is no
+        inode) uniquely identifying a file.
+    check_new(name, path, stat_result=None):
         Takes a full path to a file and determines whether it represents a new
         file or one already loaded.
+    __load(name, path, stat_result=None, source_device=None)
+        Takes a file name and a full path, checks if it's new, and returns it
+        as an AutotagicalFile if it should be processed.
+    load_file(name, path, stat_result=None, source_device=None)
+        Takes a file name and a full path, checks if it's new, and loads it in.
     load_folder(input_folder, recurse=False, process_hidden=False)
         Load in all appropriate files in a given folder.
+    load_folders(input_folders, recurse=False, process_hidden=False,
+                 scan_threads=1)
+        Load in all appropriate files in several folders, listing directories
+        concurrently.
+    stream_folders(input_folders, recurse=False, process_hidden=False,
+                   scan_threads=1, failed=None)
+        Yields all appropriate files in several folders as they are found,
+        without storing them.
     get_file_list()
         Returns the list of files to process in a format suitable for feeding
         to determine_destination() or AutotagicalNamer.determine_names()
     """
 
-    def __init__(self, tag_formats):
+    def __init__(self, tag_formats, index=None):
         """
         Constructor.  Initialize attributes and compiles tag pattern regexes.
 
@@ -477,13 +1510,21 @@ class AutotagicalFileHandler:
         ----------
         tag_formats
             List of the form stored in AutotagicalSchema.tag_formats
+        index: AutotagicalIndex (default None)
+            An index of files processed by previous runs.  If given, files
+            that are unchanged since are not loaded.
 
         Returns
         -------
         AutotagicalFileHandler
         """
         self.__file_list = []
+        self.__devices = dict()
+        self.__file_ids = dict()
+        self.__raw_names = set()
         self.__ignore_patterns = []
+        self.__ignore_matchers = []
+        self.__index = index
         self.__tag_patterns = []
         # Try to compile tag patterns as a regex or warn
         for pattern in tag_formats:
@@ -496,6 +1537,8 @@ class AutotagicalFileHandler:
             except re.error as err:
                 logging.warning('Regex error in tag format:  %s\n%s',
                                 pattern, str(err))
+        self.__tag_literals = [required_literals(pattern['tag_pattern'])
+                               for pattern in self.__tag_patterns]
 
     def load_ignore_file(self, path):
         """
@@ -526,6 +1569,10 @@ class AutotagicalFileHandler:
                     except re.error as err:
                         logging.warning('Regex error in ignore file:  %s\n%s',
                                         line, str(err))
+                # Match all ignore patterns at once where possible
+                combined = combine_regexes(self.__ignore_patterns)
+                self.__ignore_matchers = [combined] if combined is not None \
+                    else list(self.__ignore_patterns)
                 logging.info('Loaded ignore file: %s', path)
                 logging.debug('Ignore patterns: %s',
                               str(self.__ignore_patterns))
@@ -535,7 +1582,40 @@ class AutotagicalFileHandler:
                           '%s', path)
         return False
 
-    def check_new(self, name, path):
+    @staticmethod
+    def __file_id(path, stat_result=None):
+        """
+        Returns the (st_dev, st_ino) tuple uniquely identifying a file.
+        Cached stat() results of directory entries have no device or inode on
+        Windows (both are 0), so the file is stat'ed again if so.  If even
+        that gives no inode (e.g. on some filesystems without them), the
+        file's real path identifies it instead.
+
+        Parameters
+        ----------
+        path: str
+            The path to the file (including file name)
+        stat_result: os.stat_result (default None)
+            The result of stat() on the file, if already known.
+
+        Returns
+        -------
+        (int, int), (None, str), or None
+            The device and inode of the file, (None, real path) if it has no
+            inode, or None if it could not be stat'ed (e.g. a broken symlink).
+        """
+        if stat_result is None or not stat_result.st_ino:
+            try:
+                stat_result = os.stat(path)
+            except OSError as err:
+                logging.warning('Could not stat file at: %s\n%s', path,
+                                str(err))
+                return None
+        if not stat_result.st_ino:
+            return (None, os.path.normcase(os.path.realpath(path)))
+        return (stat_result.st_dev, stat_result.st_ino)
+
+    def check_new(self, name, path, stat_result=None):
         """
         Takes a full path to a file and determines whether it represents a new
         file or one already loaded.
@@ -546,23 +1626,73 @@ class AutotagicalFileHandler:
             The full name of the file.
         path: str
             The path to the file (including file name)
+        stat_result: os.stat_result (default None)
+            The result of stat() on the file, if already known (e.g. from
+            os.DirEntry.stat()).  The file will only be stat'ed if this is not
+            provided and a file with the same name has already been loaded.
 
         Returns
         -------
         bool
             True if file has not been loaded before, False otherwise.
         """
-        # Check all known files
-        for file in self.__file_list:
-            # Only need to do more serious checking if file names match
-            if file.raw_name == name:
-                if os.path.samefile(file.original_path, path):
-                    logging.info('Skipping double processing the file at: %s',
-                                 path)
-                    return False
+        # Only need to do more serious checking if file names match
+        if name not in self.__raw_names:
+            return True
+        file_id = self.__file_id(path, stat_result)
+        if file_id and name in self.__file_ids.get(file_id, ()):
+            logging.info('Skipping double processing the file at: %s', path)
+            return False
         return True
 
-    def load_file(self, name, path):
+    def __load(self, name, path, stat_result=None, source_device=None):
+        """
+        Takes a file name and a full path, checks if it's new, and returns it
+        as an AutotagicalFile if it should be processed.  It is remembered as
+        loaded, but not stored.
+
+        Parameters
+        ----------
+        name: str
+            The full name of the file.
+        path: str
+            The path to the file (including file name)
+        stat_result: os.stat_result (default None)
+            The result of stat() on the file, if already known (e.g. from
+            os.DirEntry.stat()).  Otherwise, the file will be stat'ed if it is
+            loaded.
+        source_device: int (default None)
+            The device (st_dev) of the file itself, if already known (e.g.
+            from _entry_device()).  Stored as the loaded file's source_device.
+
+        Returns
+        -------
+        AutotagicalFile or None
+            The loaded file, or None if it should not be processed.
+        """
+        # Skip files processed by a previous run and unchanged since
+        if self.__index is not None and \
+           self.__index.is_unchanged(path, stat_result):
+            logging.debug('Skipping file unchanged since last run: %s', path)
+            return None
+        # Only load file if it hasn't been encountered before
+        if not self.check_new(name, path, stat_result):
+            return None
+        loaded = AutotagicalFile.load_file(name, path, self.__tag_patterns,
+                                           self.__ignore_matchers,
+                                           self.__tag_literals)
+        # If file was loaded, remember it
+        if loaded:
+            file_id = self.__file_id(path, stat_result)
+            if file_id:
+                self.__file_ids.setdefault(file_id, set()).add(name)
+            self.__raw_names.add(name)
+            if source_device is not None:
+                loaded.source_device = self.__devices.setdefault(
+                    source_device, source_device)
+        return loaded
+
+    def load_file(self, name, path, stat_result=None, source_device=None):
         """
         Takes a file name and a full path, checks if it's new, and loads it in.
 
@@ -572,21 +1702,24 @@ class AutotagicalFileHandler:
             The full name of the file.
         path: str
             The path to the file (including file name)
+        stat_result: os.stat_result (default None)
+            The result of stat() on the file, if already known (e.g. from
+            os.DirEntry.stat()).  Otherwise, the file will be stat'ed if it is
+            loaded.
+        source_device: int (default None)
+            The device (st_dev) of the file itself, if already known (e.g.
+            from _entry_device()).  Stored as the loaded file's source_device.
 
         Returns
         -------
         bool
             True if file was loaded, False otherwise.
         """
-        # Only load file if it hasn't been encountered before
-        if self.check_new(name, path):
-            to_append = AutotagicalFile.load_file(name, path,
-                                                  self.__tag_patterns,
-                                                  self.__ignore_patterns)
-            # If file was loaded, append it to the list
-            if to_append:
-                self.__file_list.append(to_append)
-                return True
+        to_append = self.__load(name, path, stat_result, source_device)
+        # If file was loaded, append it to the list
+        if to_append:
+            self.__file_list.append(to_append)
+            return True
         return False
 
     def load_folder(self, input_folder, recurse=False, process_hidden=False):
@@ -608,33 +1741,76 @@ class AutotagicalFileHandler:
         bool
             True if load was successful, False otherwise.
         """
-        try:
-            if recurse:
-                # If loading recursively, use os.walk
-                for root, dirs, files in os.walk(input_folder):
-                    if not process_hidden:
-                        # If not processing hidden files, remove hidden files
-                        # and directories from those to consider.
-                        files = [f for f in files if not f[0] == '.']
-                        dirs[:] = [d for d in dirs if not d[0] == '.']
-                    # Try to load each file and append it to the file list
-                    for file in files:
-                        self.load_file(file, os.path.join(root, file))
-            else:
-                # If not loading recursively, use os.scandir
-                with os.scandir(input_folder) as entries:
-                    for entry in entries:
-                        # For each entry, check if it's a file and not hidden
-                        # (or processing hidden)
-                        if entry.is_file() and (process_hidden
-                                                or not
-                                                entry.name.startswith('.')):
-                            self.load_file(entry.name, entry.path)
-        except FileNotFoundError as err:
-            logging.error('Error with input folder: %s', str(err))
-            return False
-        # If no exceptions, return True
-        return True
+        return self.load_folders([input_folder], recurse, process_hidden)
+
+    def load_folders(self, input_folders, recurse=False, process_hidden=False,
+                     scan_threads=1):
+        """
+        Load in all appropriate files in several folders, listing directories
+        concurrently in a pool of threads.  Files are loaded in the same order
+        as calling load_folder() on each folder in turn would.
+
+        Parameters
+        ----------
+        input_folders: list of str
+            Paths to folders to load files from.
+        recurse: bool
+            If True, will descend into subfolders recursively.
+        process_hidden: bool
+            If True, will process files beginning with '.' and (if recurse is
+            True) descend into directories beginning with '.'
+        scan_threads: int
+            Number of threads to list directories with.  If 1 or less, folders
+            are simply listed one after another.
+
+        Returns
+        -------
+        bool
+            True if all loads were successful, False otherwise.
+        """
+        failed = []
+        for entry in _scan_folders(input_folders, recurse, process_hidden,
+                                   scan_threads, failed):
+            self.load_file(entry.name, entry.path, _entry_stat(entry),
+                           _entry_device(entry))
+        return not failed
+
+    def stream_folders(self, input_folders, recurse=False,
+                       process_hidden=False, scan_threads=1, failed=None):
+        """
+        Yields all appropriate files in several folders as they are found, in
+        the same order load_folders() would load them.  Files are not stored
+        (so are not returned by get_file_list()), but are still remembered so
+        that none is yielded twice: the raw name and file ID of every file
+        yielded is kept, so memory still grows (slowly) with the number of
+        files.
+
+        Parameters
+        ----------
+        input_folders: list of str
+            Paths to folders to load files from.
+        recurse: bool
+            If True, will descend into subfolders recursively.
+        process_hidden: bool
+            If True, will process files beginning with '.' and (if recurse is
+            True) descend into directories beginning with '.'
+        scan_threads: int
+            Number of threads to list directories with.
+        failed: list of str (default None)
+            If given, input folders that could not be loaded are appended to
+            it.
+
+        Returns
+        -------
+        generator of AutotagicalFile
+            The files to process.
+        """
+        for entry in _scan_folders(input_folders, recurse, process_hidden,
+                                   scan_threads, failed):
+            loaded = self.__load(entry.name, entry.path, _entry_stat(entry),
+                                 _entry_device(entry))
+            if loaded:
+                yield loaded
 
     def get_file_list(self):
         """
@@ -13,14 +13,43 @@ Constants
 _CONDITION_REGEX
     A compiled regex for parsing the components of a single condition.  Not
     intended for use outside of this module.
+_COMPILED_CONDITIONS, _COMPILED_CONDITION_SETS, _COMPILED_FILTERS
+    Caches of compiled conditions, condition sets, and filters, keyed by their
+    source strings.  Not intended for use outside of this module.
+_FILTER_INDEXES
+    Cache of filter indexes, keyed by the sources of their filters.  Not
+    intended for use outside of this module.
+BATCH_AVAILABLE
+    Whether NumPy (an optional dependency) is installed, so that FilterBatch
+    may be used.
 
 Classes
 -------
 FilterError(Exception)
     Exception raised when a serious problem is discovered in a filter.
+CompiledCondition
+    An immutable, pre-parsed single condition.
+CompiledConditionSet
+    An immutable, pre-parsed condition set.
+CompiledFilter
+    An immutable, pre-parsed filter.
+FilterIndex
+    An inverted index from tags and tag groups to the filters (of a list of
+    filters) that could match files with them.
+FilterBatch
+    A batch of tag sets, against which filters are checked all at once with
+    NumPy.
 
 Functions
 ---------
+compile_condition(condition)
+    Parses a single condition into a (cached) CompiledCondition.
+compile_condition_set(condition_set)
+    Parses a condition set into a (cached) CompiledConditionSet.
+compile_filter(check_filter)
+    Parses a filter into a (cached) CompiledFilter.
+index_filters(filters)
+    Builds a (cached) FilterIndex for a list of filters.
 split_condition_set_to_conditions(condition_set)
     Takes a condition set and splits it at the and operator: /&|  This function
     warns if it encounters what looks to be a malformed condition set.
@@ -39,6 +68,12 @@ check_against_filter(tag_array, filter, tag_groups)
 
 import logging
 import re
+from collections import namedtuple
+try:
+    import numpy
+except ImportError:
+    numpy = None  # pylint: disable=C0103
+from autotagical.tags import TAG_DICTIONARY, tag_ids
 
 # Regex for understanding a condition.
 _CONDITION_REGEX = re.compile(r'^(?P<negated>/!\|)?'
@@ -46,18 +81,486 @@ _CONDITION_REGEX = re.compile(r'^(?P<negated>/!\|)?'
                               r'(?:/G\|(?P<tag_group>[^/]+))|'
                               r'(?P<tag>[^/]+))$')
 
+# Caches of everything compiled so far, so each is only ever parsed once.
+_COMPILED_CONDITIONS = dict()
+_COMPILED_CONDITION_SETS = dict()
+_COMPILED_FILTERS = dict()
+_FILTER_INDEXES = dict()
+
+# NumPy is optional; without it, filters are only ever checked one tag set at
+# a time.
+BATCH_AVAILABLE = numpy is not None
+
 
 class FilterError(Exception):
     """Exception raised when a serious problem is discovered in a filter."""
 
     def __init__(self, message):
-        super().__init__()
+        # Passed on so that it survives pickling (e.g. from worker processes)
+        super().__init__(message)
         self.message = message
 
     def __str__(self):
         return str(self.message)
 
 
+class CompiledCondition(namedtuple('CompiledCondition',
+                                   ['negated', 'wildcard', 'tag', 'tag_group',
+                                    'source'])):
+    """
+    An immutable, pre-parsed single condition.  Produce these with
+    compile_condition().
+
+    Attributes
+    ----------
+    negated: bool
+        Whether the condition was negated with the /!| operator.
+    wildcard: bool
+        Whether the condition is the /*| operator.
+    tag: str or None
+        The tag literal to check for, if the condition is a tag.  It is the
+        canonical copy in TAG_DICTIONARY, so is found in a file's tag_set by
+        identity.
+    tag_group: str or None
+        The name of the group to check, if the condition is a /G| operator.
+    source: str
+        The condition as originally written.  If wildcard is False and both tag
+        and tag_group are None, the condition was malformed and will raise a
+        FilterError when checked.
+    """
+    __slots__ = ()
+
+
+class CompiledConditionSet(namedtuple('CompiledConditionSet',
+                                      ['conditions', 'source'])):
+    """
+    An immutable, pre-parsed condition set.  Produce these with
+    compile_condition_set().
+
+    Attributes
+    ----------
+    conditions: tuple of CompiledCondition
+        The conditions, all of which must be true for the set to be true.  If
+        empty, the condition set will raise a FilterError when checked.
+    source: str
+        The condition set as originally written.
+    """
+    __slots__ = ()
+
+
+class CompiledFilter(namedtuple('CompiledFilter',
+                                ['condition_sets', 'source'])):
+    """
+    An immutable, pre-parsed filter.  Produce these with compile_filter().
+
+    Attributes
+    ----------
+    condition_sets: tuple of CompiledConditionSet
+        The condition sets, any of which may be true for the filter to be
+        true.  If empty, the filter will raise a FilterError when checked.
+    source: tuple of str
+        The filter as originally written.
+    """
+    __slots__ = ()
+
+
+class FilterIndex:
+    """
+    An inverted index from tags and tag groups to the filters (of a list of
+    filters, in priority order) that could match files with them.  Each
+    condition set is indexed by one positive tag or tag group it requires, so
+    a filter can only match a file if the file has the tag (or a tag in the
+    group) of at least one of its condition sets.  Condition sets requiring
+    no positive tag or group (e.g. only wildcards and negations) could match
+    any file.  Produce these with index_filters().
+
+    Instance Attributes
+    -------------------
+    filters: tuple of CompiledFilter
+        The indexed filters, in priority order.
+    __always: set of int
+        Positions of filters that could match any file.
+    __by_tag: dict
+        A dictionary with tag IDs (in TAG_DICTIONARY) as keys and sets of
+        positions of filters with a condition set requiring the tag as values.
+    __by_group: dict
+        A dictionary with tag group names as keys and sets of positions of
+        filters with a condition set requiring a tag in the group as values.
+
+    Methods
+    -------
+    __init__(filters)
+        Constructor.  Indexes each filter by the tags and groups its
+        condition sets require.
+    candidates(tag_set, tag_groups)
+        Returns the positions of the filters that could match a set of tags,
+        in priority order.
+    """
+
+    def __init__(self, filters):
+        """
+        Constructor.  Indexes each filter by the tags and groups its
+        condition sets require.
+
+        Parameters
+        ----------
+        filters: list of (list of str or CompiledFilter)
+            The filters to index, in priority order.
+
+        Returns
+        -------
+        FilterIndex
+        """
+        self.filters = tuple(compile_filter(check_filter)
+                             for check_filter in filters)
+        self.__always = set()
+        self.__by_tag = dict()
+        self.__by_group = dict()
+        for position, check_filter in enumerate(self.filters):
+            # Empty filters must still be checked (to raise an error)
+            if not check_filter.condition_sets:
+                self.__always.add(position)
+            for condition_set in check_filter.condition_sets:
+                tags = [condition.tag for condition in condition_set.conditions
+                        if condition.tag is not None and not condition.negated]
+                groups = [condition.tag_group for condition
+                          in condition_set.conditions
+                          if condition.tag_group is not None
+                          and not condition.negated]
+                if tags:
+                    self.__by_tag.setdefault(TAG_DICTIONARY.id_of(tags[0]),
+                                             set()).add(position)
+                elif groups:
+                    self.__by_group.setdefault(groups[0], set()).add(position)
+                else:
+                    # Wildcards, negations, or malformed conditions only
+                    self.__always.add(position)
+
+    def candidates(self, tag_set, tag_groups):
+        """
+        Returns the positions of the filters that could match a set of tags,
+        in priority order.  All other filters certainly do not match.
+
+        Parameters
+        ----------
+        tag_set: TagSet or frozenset of str
+            The tags to find filters for (e.g. AutotagicalFile.tag_set).
+        tag_groups: AutotagicalGroups
+            An AutotagicalGroups object that will be used to resolve group
+            operators.
+
+        Returns
+        -------
+        list of int
+            The positions (in filters) of the candidate filters, in order.
+        """
+        positions = set(self.__always)
+        for tag_id in tag_ids(tag_set):
+            found = self.__by_tag.get(tag_id)
+            if found is not None:
+                positions.update(found)
+        if self.__by_group:
+            groups = tag_groups.groups_of_tags(tag_set)
+            for group, found in self.__by_group.items():
+                if group in groups:
+                    positions.update(found)
+        return sorted(positions)
+
+
+class FilterBatch:
+    """
+    A batch of tag sets (e.g. the distinct tag sets of many files), against
+    which filters are checked all at once with NumPy.  The batch is stored as
+    a sparse (tag set x tag) incidence matrix, in the form of the row of every
+    tag of every tag set sorted by tag ID, so that each condition becomes a
+    boolean column over all tag sets, each condition set the AND of its
+    columns, and each filter the OR of its condition sets.  Columns are
+    remembered, so each condition is only evaluated once per batch.  Requires
+    NumPy (see BATCH_AVAILABLE).
+
+    Unlike check_against_filter(), every condition of a filter is evaluated,
+    so a malformed condition raises a FilterError even where checking one tag
+    set at a time would have stopped before reaching it.  Nothing is logged
+    when this happens, so that the caller may fall back to checking tag sets
+    one at a time.
+
+    Instance Attributes
+    -------------------
+    tag_sets: tuple of TagSet
+        The tag sets in the batch, one per row.
+    __tag_groups: AutotagicalGroups
+        The AutotagicalGroups object used to resolve group operators.
+    __present: frozenset of int
+        The IDs of every tag in the batch.
+    __tags: numpy.ndarray
+        The ID of every tag of every tag set, sorted.
+    __rows: numpy.ndarray
+        The row of the tag set each entry of __tags is from.
+    __columns: dict
+        A dictionary with condition sources as keys and the (boolean) columns
+        of the conditions as values.
+
+    Methods
+    -------
+    __init__(tag_sets, tag_groups)
+        Constructor.  Builds the incidence matrix of the tag sets.
+    __len__()
+        Returns the number of tag sets in the batch.
+    __rows_with(wanted)
+        Returns the column of which tag sets have any of the tags.
+    __condition(condition)
+        Returns the column of which tag sets match a condition.
+    matching_rows(check_filter, rows=None)
+        Determines which tag sets match a filter.
+    """
+
+    def __init__(self, tag_sets, tag_groups):
+        """
+        Constructor.  Builds the incidence matrix of the tag sets.
+
+        Parameters
+        ----------
+        tag_sets: list of TagSet
+            The tag sets to check (e.g. AutotagicalFile.tag_set).
+        tag_groups: AutotagicalGroups
+            An AutotagicalGroups object that will be used to resolve group
+            operators.
+
+        Returns
+        -------
+        FilterBatch
+        """
+        self.tag_sets = tuple(tag_sets)
+        self.__tag_groups = tag_groups
+        counts = numpy.fromiter((len(tag_set) for tag_set in self.tag_sets),
+                                dtype=numpy.intp, count=len(self.tag_sets))
+        tags = numpy.fromiter((tag_id for tag_set in self.tag_sets
+                               for tag_id in tag_set.ids),
+                              dtype=numpy.intp, count=int(counts.sum()))
+        rows = numpy.repeat(numpy.arange(len(self.tag_sets)), counts)
+        order = numpy.argsort(tags, kind='stable')
+        self.__tags = tags[order]
+        self.__rows = rows[order]
+        self.__present = frozenset(numpy.unique(self.__tags).tolist())
+        self.__columns = dict()
+
+    def __len__(self):
+        """
+        Returns the number of tag sets in the batch.
+        """
+        return len(self.tag_sets)
+
+    def __rows_with(self, wanted):
+        """
+        Returns the column of which tag sets have any of the tags.
+
+        Parameters
+        ----------
+        wanted: list of int
+            The IDs of the tags.
+
+        Returns
+        -------
+        numpy.ndarray
+            A boolean array, True for each tag set with any of the tags.
+        """
+        column = numpy.zeros(len(self.tag_sets), dtype=bool)
+        if len(wanted) == 1:
+            # Entries are sorted by tag, so a single tag is a slice
+            start = numpy.searchsorted(self.__tags, wanted[0], side='left')
+            end = numpy.searchsorted(self.__tags, wanted[0], side='right')
+            column[self.__rows[start:end]] = True
+        elif wanted:
+            column[self.__rows[numpy.isin(self.__tags, wanted)]] = True
+        return column
+
+    def __condition(self, condition):
+        """
+        Returns the column of which tag sets match a condition.
+
+        Parameters
+        ----------
+        condition: CompiledCondition
+            The condition.
+
+        Returns
+        -------
+        numpy.ndarray
+            A boolean array, True for each tag set matching the condition.
+        """
+        column = self.__columns.get(condition.source)
+        if column is not None:
+            return column
+        if condition.wildcard:
+            column = numpy.ones(len(self.tag_sets), dtype=bool)
+        elif condition.tag is not None:
+            tag_id = TAG_DICTIONARY.id_of(condition.tag)
+            column = self.__rows_with([tag_id] if tag_id in self.__present
+                                      else [])
+        elif condition.tag_group is not None:
+            column = self.__rows_with(sorted(self.__present.intersection(
+                self.__tag_groups.group_ids(condition.tag_group,
+                                            self.__present))))
+        else:
+            raise FilterError('Malformed condition encountered: "' +
+                              condition.source + '"')
+        if condition.negated:
+            column = ~column
+        self.__columns[condition.source] = column
+        return column
+
+    def matching_rows(self, check_filter, rows=None):
+        """
+        Determines which tag sets match a filter.
+
+        Parameters
+        ----------
+        check_filter: list of str or CompiledFilter
+            The filter.
+        rows: list of int, numpy.ndarray, or None (default None)
+            The rows of the tag sets to check, or None to check all of them.
+
+        Returns
+        -------
+        numpy.ndarray
+            The rows (of rows, in order, if given) of the tag sets matching
+            the filter.
+        """
+        check_filter = compile_filter(check_filter)
+        if not check_filter.condition_sets:
+            raise FilterError('Malformed filter encountered: Completely '
+                              'empty!')
+        matched = numpy.zeros(len(self.tag_sets), dtype=bool)
+        for condition_set in check_filter.condition_sets:
+            if not condition_set.conditions:
+                raise FilterError('Malformed condition set encountered: '
+                                  'Completely empty!')
+            matched_set = self.__condition(condition_set.conditions[0])
+            for condition in condition_set.conditions[1:]:
+                matched_set = matched_set & self.__condition(condition)
+            matched |= matched_set
+        if rows is None:
+            return matched.nonzero()[0]
+        rows = numpy.asarray(rows, dtype=numpy.intp)
+        return rows[matched[rows]]
+
+
+def compile_condition(condition):
+    """
+    Parses a single condition into a (cached) CompiledCondition.  This never
+    fails; malformed conditions only raise a FilterError once checked.
+
+    Parameters
+    ----------
+    condition: str
+        A string with a single condition, which may contain various special
+        operators.
+
+    Returns
+    -------
+    CompiledCondition
+        The parsed condition.
+    """
+    compiled = _COMPILED_CONDITIONS.get(condition)
+    if compiled is None:
+        match = _CONDITION_REGEX.match(condition)
+        if match:
+            compiled = CompiledCondition(
+                negated=bool(match.group('negated')),
+                wildcard=bool(match.group('wildcard')),
+                tag=TAG_DICTIONARY.canonical(match.group('tag'))
+                if match.group('tag') is not None else None,
+                tag_group=match.group('tag_group'), source=condition)
+        else:
+            compiled = CompiledCondition(negated=False, wildcard=False,
+                                         tag=None, tag_group=None,
+                                         source=condition)
+        _COMPILED_CONDITIONS[condition] = compiled
+    return compiled
+
+
+def compile_condition_set(condition_set):
+    """
+    Parses a condition set into a (cached) CompiledConditionSet.  This never
+    fails; malformed condition sets only raise a FilterError once checked.
+
+    Parameters
+    ----------
+    condition_set: str or CompiledConditionSet
+        A string with the condition set, which may be multiple conditions
+        concatenated with the AND operator /&|.  Already compiled condition
+        sets are returned as-is.
+
+    Returns
+    -------
+    CompiledConditionSet
+        The parsed condition set.
+    """
+    if isinstance(condition_set, CompiledConditionSet):
+        return condition_set
+    compiled = _COMPILED_CONDITION_SETS.get(condition_set)
+    if compiled is None:
+        compiled = CompiledConditionSet(
+            conditions=tuple(compile_condition(condition) for condition in
+                             split_condition_set_to_conditions(condition_set)),
+            source=condition_set)
+        _COMPILED_CONDITION_SETS[condition_set] = compiled
+    return compiled
+
+
+def compile_filter(check_filter):
+    """
+    Parses a filter into a (cached) CompiledFilter.  This never fails;
+    malformed filters only raise a FilterError once checked.
+
+    Parameters
+    ----------
+    check_filter: list of str or CompiledFilter
+        A list of strings, each containing a condition set.  Already compiled
+        filters are returned as-is.
+
+    Returns
+    -------
+    CompiledFilter
+        The parsed filter.
+    """
+    if isinstance(check_filter, CompiledFilter):
+        return check_filter
+    key = tuple(check_filter)
+    compiled = _COMPILED_FILTERS.get(key)
+    if compiled is None:
+        compiled = CompiledFilter(
+            condition_sets=tuple(compile_condition_set(condition_set)
+                                 for condition_set in key),
+            source=key)
+        _COMPILED_FILTERS[key] = compiled
+    return compiled
+
+
+def index_filters(filters):
+    """
+    Builds a (cached) FilterIndex for a list of filters, e.g. those of a
+    list of renaming schemas or of the sublevels of a filter level.
+
+    Parameters
+    ----------
+    filters: list of (list of str or CompiledFilter)
+        The filters to index, in priority order.
+
+    Returns
+    -------
+    FilterIndex
+        The index of the filters.
+    """
+    key = tuple(compile_filter(check_filter).source for check_filter
+                in filters)
+    index = _FILTER_INDEXES.get(key)
+    if index is None:
+        index = FilterIndex(filters)
+        _FILTER_INDEXES[key] = index
+    return index
+
+
 def split_condition_set_to_conditions(condition_set):
     """
     Takes a condition set and splits it at the and operator: /&|  This function
@@ -99,11 +602,12 @@ def check_condition(tag_array, condition, tag_groups):
 
     Parameters
     ----------
-    tag_array: list of str
+    tag_array: list of str or frozenset of str
         A list of strings, each holding a tag.  These tags will be considered
         as a whole against the provided condition.  It should be in the form:
             ['tag1', 'tag2', ...]
-    condition: str
+        Passing a set (e.g. AutotagicalFile.tag_set) makes checks faster.
+    condition: str or CompiledCondition
         A string with the condition against which the tags will be matched.
         This may contain various special operators.
     tag_groups: AutotagicalGroups
@@ -115,39 +619,27 @@ def check_condition(tag_array, condition, tag_groups):
     bool
         True if the tags evaluate to true by the condition, False otherwise.
     """
+    if not isinstance(condition, CompiledCondition):
+        condition = compile_condition(condition)
 
-    # Match the condition
-    match = _CONDITION_REGEX.match(condition)
+    # If it's the wild card, it's always true (flipped if negated)
+    if condition.wildcard:
+        return not condition.negated
 
-    if match:
-        # Flip False and True if negated.
-        if match.group('negated'):
-            match_found = False
-        else:
-            match_found = True
-
-        # If it's the wild card, it's always true
-        if match.group('wildcard'):
-            return match_found
+    # If it's a tag, see if it's in the array and return accordingly
+    if condition.tag is not None:
+        return (condition.tag in tag_array) != condition.negated
 
-        # If it's a tag, see if it's in the array and return accordingly
-        if match.group('tag'):
-            if match.group('tag') in tag_array:
-                return match_found
-            return not match_found
-
-        # If it's a tag group
-        if match.group('tag_group'):
-            # See if tags match the group
-            if tag_groups.tag_in_group(tag_array, match.group('tag_group')):
-                return match_found
-            return not match_found
+    # If it's a tag group, see if tags match the group
+    if condition.tag_group is not None:
+        return tag_groups.has_tag_in_group(tag_array, condition.tag_group) \
+            != condition.negated
 
     # If here, something went horribly wrong, throw an error
     logging.error('A seriously malformed condition was encountered: "%s"',
-                  str(condition))
-    raise FilterError('Malformed condition encountered: "' + str(condition) +
-                      '"')
+                  condition.source)
+    raise FilterError('Malformed condition encountered: "' +
+                      condition.source + '"')
 
 
 def check_against_condition_set(tag_array, condition_set, tag_groups):
@@ -157,11 +649,12 @@ def check_against_condition_set(tag_array, condition_set, tag_groups):
 
     Parameters
     ----------
-    tag_array: list of str
+    tag_array: list of str or frozenset of str
         A list of strings, each holding a tag.  These tags will be considered
         as a whole against the provided condition set.  It should be in the
-        form: ['tag1', 'tag2', ...]
-    condition_set: str
+        form: ['tag1', 'tag2', ...]  Passing a set (e.g.
+        AutotagicalFile.tag_set) makes checks faster.
+    condition_set: str or CompiledConditionSet
         A string with the condition set against which the tags will be
         matched.  This may contain various special operators, and may be
         multiple conditions concatenated with the AND operator /&|.
@@ -177,7 +670,7 @@ def check_against_condition_set(tag_array, condition_set, tag_groups):
 
     # Reduce condition set to a list of conditions that all must be true for
     # the condition set to be matched
-    conditions = split_condition_set_to_conditions(condition_set)
+    conditions = compile_condition_set(condition_set).conditions
 
     if not conditions:
         # Completely empty condition set.  This is bad.
@@ -201,11 +694,12 @@ def check_against_filter(tag_array, check_filter, tag_groups):
 
     Parameters
     ----------
-    tag_array: list of str
+    tag_array: list of str or frozenset of str
         A list of strings, each holding a tag.  These tags will be considered
         as a whole against the provided filter.  It should be in the form:
             ['tag1', 'tag2', ...]
-    filter: list of str
+        Passing a set (e.g. AutotagicalFile.tag_set) makes checks faster.
+    filter: list of str or CompiledFilter
         A list of strings, each containing a condition set against which the
         tags will be matched.  Each may contain various special operators and
         may be multiple conditions concatenated with the AND operator /&|.
@@ -218,22 +712,23 @@ def check_against_filter(tag_array, check_filter, tag_groups):
     bool
         True if the tags match at least one filter, False otherwise.
     """
+    check_filter = compile_filter(check_filter)
 
-    if not check_filter:
+    if not check_filter.condition_sets:
         # Completely empty filter.  This is bad.
         logging.error('A filter was completely empty!')
         raise FilterError('Malformed filter encountered: Completely empty!')
 
     # Check each condition set individually
-    for condition_set in check_filter:
+    for condition_set in check_filter.condition_sets:
         # If a condition set is true, no need to check any further.
         if check_against_condition_set(tag_array, condition_set, tag_groups):
             logging.debug('Tag Array: %s matched condition set: %s from %s',
-                          str(tag_array), str(condition_set),
-                          str(check_filter))
+                          tag_array, condition_set.source,
+                          check_filter.source)
             return True
 
     # If no condition sets were matched, return False
     logging.debug('Tag Array: %s did not match any condition set in %s',
-                  str(tag_array), str(check_filter))
+                  tag_array, check_filter.source)
     return False
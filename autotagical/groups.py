@@ -8,6 +8,12 @@ This is *autotagical.groups*.
 It contains the *AutotagicalGroups* class, used to load and work with tag
 groups.
 
+Functions
+---------
+combine_regexes(patterns)
+    Combines compiled regexes into a single alternation that (fully) matches
+    exactly what any of them would, if possible.
+
 Classes
 -------
 AutotagicalGroups
@@ -21,6 +27,45 @@ import os
 import re
 from jsonschema import validate, ValidationError
 from packaging import version
+from autotagical.tags import TAG_DICTIONARY, tag_ids
+
+
+def combine_regexes(patterns):
+    """
+    Combines compiled regexes into a single alternation that (fully) matches
+    exactly what any of them would.  This is not possible if more than one of
+    them has capturing groups (as backreferences would be renumbered) or if
+    any sets flags (as they would apply to all).
+
+    Parameters
+    ----------
+    patterns: list of re.Pattern
+        The regexes to combine.
+
+    Returns
+    -------
+    re.Pattern or None
+        The combined regex, or None if there is nothing to combine or they
+        cannot be combined.
+    """
+    if len(patterns) < 2:
+        return None
+    default_flags = re.compile('').flags
+    if any(pattern.flags != default_flags for pattern in patterns) or \
+       sum(1 for pattern in patterns if pattern.groups) > 1:
+        return None
+    try:
+        combined = re.compile('|'.join(
+            '(?:' + pattern.pattern + ')'
+            for pattern in sorted(patterns,
+                                  key=lambda pattern: pattern.pattern)))
+    except re.error:
+        return None
+    # Wrapping each must not have changed the groups or flags
+    if combined.flags != default_flags or \
+       combined.groups != sum(pattern.groups for pattern in patterns):
+        return None
+    return combined
 
 
 # pylint: disable=R0902
@@ -68,6 +113,23 @@ class AutotagicalGroups:
     __regex_group_data: dict
         A dictionary with strings as keys, represnting tag group names, and
         values that are lists of compiled regexes.
+    __regex_matchers: dict
+        A dictionary with strings as keys, representing tag group names, and
+        values that are lists of compiled regexes to match tags against.  Each
+        is a single regex combining all of a group's regexes, unless they
+        could not be combined without changing what they match.
+    __group_ids: dict
+        A dictionary with strings as keys, representing tag group names, and
+        values that are sets of the IDs (in TAG_DICTIONARY) of the tags known
+        to be in them.  Built from the tags they list by process_groups(),
+        then tags matching their regexes are added as they are seen.
+    __tag_index: dict
+        A dictionary with tag IDs as keys and frozensets of the names of the
+        groups listing them (literally) as values.  Built by process_groups().
+    __tag_memberships: dict
+        A dictionary with tag IDs as keys and frozensets of the names of all
+        groups they are in (including by regex) as values.  Filled in as tags
+        are seen, so each tag is only matched against each regex once.
     tag_group_schema: dict
         The JSON schema against which to validate autotagical tag group files.
     tagspaces_schema: dict
@@ -85,12 +147,26 @@ class AutotagicalGroups:
         updates the tags in self.__group_data.
     __resolve_inheritance():
         Resolves inheritance notes stored in self.__inheritance.
+    __compile_regexes():
+        Compiles all regexes in self.__to_compile.
+    __build_tag_index():
+        Builds the reverse index from tags to the groups listing them.
     process_groups()
         Perform all necessary setup once groups are loaded (e.g. resolving
         inheritance).
+    __memberships(tag_id)
+        Returns the names of all groups a tag is in, including by regex.
+    __check_regexes(ids)
+        Matches the tags among ids not yet seen against every regex.
+    groups_of_tags(tags)
+        Returns the names of all groups any of a collection of tags is in.
     tag_in_group(tag_array, group)
         Determines if a tag array matches the specified group and returns the
         first matching tag.
+    has_tag_in_group(tags, group)
+        Determines if any of a collection of tags is in the specified group.
+    group_ids(group, ids=())
+        Returns the IDs of the tags known to be in the specified group.
     load_autotagical_format(json_input, append=False)
         Loads tag groups from JSON data in the *autotagical* format.  This does
         not validate the data, as this should be handled upstream.
@@ -123,6 +199,10 @@ class AutotagicalGroups:
         self.__inheritance = dict()
         self.__to_compile = dict()
         self.__regex_group_data = dict()
+        self.__regex_matchers = dict()
+        self.__group_ids = dict()
+        self.__tag_index = dict()
+        self.__tag_memberships = dict()
         self.__loaded_autotagical_format = False
         # Load autotagical tag group validation schema or fail with message
         try:
@@ -272,6 +352,36 @@ class AutotagicalGroups:
                 except re.error as err:
                     logging.warning('Regex error in tag group regex: %s\n%s',
                                     pattern, str(err))
+        # Match each group with one regex where possible
+        self.__regex_matchers = dict()
+        for group, patterns in self.__regex_group_data.items():
+            combined = combine_regexes(patterns)
+            self.__regex_matchers[group] = [combined] if combined is not None \
+                else patterns
+
+    def __build_tag_index(self):
+        """
+        Builds the reverse index from tags (by ID) to the groups listing them
+        and the IDs of the tags in each group, and forgets all memberships
+        found so far.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        tag_index = dict()
+        self.__group_ids = dict()
+        for group, tags in self.__group_data.items():
+            self.__group_ids[group] = set(tag_ids(tags))
+            for tag_id in self.__group_ids[group]:
+                tag_index.setdefault(tag_id, set()).add(group)
+        self.__tag_index = {tag_id: frozenset(groups) for tag_id, groups
+                            in tag_index.items()}
+        self.__tag_memberships = dict()
 
     def process_groups(self):
         """
@@ -316,6 +426,78 @@ class AutotagicalGroups:
             # Process special groups
             self.__resolve_inheritance()
             self.__compile_regexes()
+        # Index which groups each tag is in
+        self.__build_tag_index()
+
+    def __memberships(self, tag_id):
+        """
+        Returns the names of all groups a tag is in, including by regex.  This
+        is remembered (and the tag added to the IDs of the groups whose
+        regexes it matches), so a tag is only ever matched against each regex
+        once.
+
+        Parameters
+        ----------
+        tag_id: int
+            The ID (in TAG_DICTIONARY) of the tag to find groups for.
+
+        Returns
+        -------
+        frozenset of str
+            The names of the groups the tag is in.
+        """
+        groups = self.__tag_memberships.get(tag_id)
+        if groups is None:
+            matched = set(self.__tag_index.get(tag_id, ()))
+            tag = TAG_DICTIONARY.tag_of(tag_id)
+            for group, patterns in self.__regex_matchers.items():
+                if group not in matched and \
+                   any(pattern.fullmatch(tag) for pattern in patterns):
+                    matched.add(group)
+                    self.__group_ids[group].add(tag_id)
+            groups = frozenset(matched)
+            self.__tag_memberships[tag_id] = groups
+        return groups
+
+    def __check_regexes(self, ids):
+        """
+        Matches the tags among ids that have not been seen before against
+        every regex, so that the IDs of groups with regexes include them if
+        they match.
+
+        Parameters
+        ----------
+        ids: iterable of int
+            The IDs of the tags to check.
+
+        Returns
+        -------
+        None
+        """
+        for tag_id in ids:
+            if tag_id not in self.__tag_memberships:
+                self.__memberships(tag_id)
+
+    def groups_of_tags(self, tags):
+        """
+        Returns the names of all groups any of a collection of tags is in,
+        including by regex.
+
+        Parameters
+        ----------
+        tags: TagSet, frozenset of str, or list of str
+            The tags to find groups for.  Passing a TagSet (e.g.
+            AutotagicalFile.tag_set) saves looking up their IDs.
+
+        Returns
+        -------
+        set of str
+            The names of the groups.
+        """
+        groups = set()
+        for tag_id in tag_ids(tags):
+            groups.update(self.__memberships(tag_id))
+        return groups
 
     def tag_in_group(self, tag_array, group):
         """
@@ -335,21 +517,64 @@ class AutotagicalGroups:
             Returns the first tag that is in the group or an empty string if
             none do.
         """
-        # Check if group exists, print error if it doesn't and return None.
+        ids = [TAG_DICTIONARY.id_of(tag) for tag in tag_array]
+        # Warns (and is empty) if the group doesn't exist
+        group_ids = self.group_ids(group, ids)
+        for tag, tag_id in zip(tag_array, ids):
+            if tag_id in group_ids:
+                return tag
+        return ''
+
+    def has_tag_in_group(self, tags, group):
+        """
+        Determines if any of a collection of tags is in the specified group.
+        Unlike tag_in_group(), this does not care about tag order, so set
+        operations may be used.
+
+        Parameters
+        ----------
+        tags: TagSet, frozenset of str, or list of str
+            The tags to be checked.  Passing a TagSet (e.g.
+            AutotagicalFile.tag_set) saves looking up their IDs.
+        group: str
+            The group name to check.
+
+        Returns
+        -------
+        bool
+            True if any tag is in the group, False otherwise.
+        """
+        ids = tag_ids(tags)
+        return not self.group_ids(group, ids).isdisjoint(ids)
+
+    def group_ids(self, group, ids=()):
+        """
+        Returns the IDs (in TAG_DICTIONARY) of the tags known to be in the
+        specified group, after matching those among ids against its regexes,
+        so that any of them in the group are included.
+
+        Parameters
+        ----------
+        group: str
+            The group name.
+        ids: iterable of int (default ())
+            The IDs of the tags that will be checked against the group.
+
+        Returns
+        -------
+        set of int
+            The IDs of the tags in the group (not to be modified), or an empty
+            set if there is no such group.
+        """
+        # Check if group exists, print error if it doesn't and return nothing.
         if group not in self.__group_data:
             logging.warning('Malformed condition encountered: Tag group "%s" '
                             'is not among loaded tag groups', str(group))
-            return ''
-        has_regexes = group in self.__regex_group_data
-        for tag in tag_array:
-            if tag in self.__group_data[group]:
-                return tag
-            # Only check regexes if the group has them.
-            if has_regexes:
-                for pattern in self.__regex_group_data[group]:
-                    if pattern.fullmatch(tag):
-                        return tag
-        return ''
+            return frozenset()
+        # Only check (remembered) regex matches if the group has regexes.
+        if group in self.__regex_group_data:
+            self.__check_regexes(ids)
+        return self.__group_ids[group]
 
     def load_autotagical_format(self, json_input, append=False):
         """
@@ -402,6 +627,7 @@ class AutotagicalGroups:
             self.__inheritance = dict()
             self.__to_compile = dict()
             self.__regex_group_data = dict()
+            self.__regex_matchers = dict()
 
         for group in json_input['tag_groups']:
             # Bad practice to have the same group multiple times, so warn but
@@ -458,6 +684,7 @@ class AutotagicalGroups:
             self.__inheritance = dict()
             self.__to_compile = dict()
             self.__regex_group_data = dict()
+            self.__regex_matchers = dict()
             self.__loaded_autotagical_format = False
 
         try:
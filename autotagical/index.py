@@ -0,0 +1,456 @@
+"""
+=================
+autotagical.index
+=================
+
+This is *autotagical.index*.
+
+It contains the AutotagicalIndex class, used to remember the files processed
+by previous runs of autotagical, so that incremental runs need only process
+new or changed files.
+
+---------
+Constants
+---------
+_FINGERPRINT_SETTINGS
+    Names of the settings that change how files are processed, and so are part
+    of the fingerprint.
+
+---------
+Functions
+---------
+fingerprint(settings)
+    Produces a fingerprint of everything that determines how files are
+    processed, i.e. the schema, tag groups, and relevant settings.
+
+-------
+Classes
+-------
+AutotagicalIndex
+    Remembers files processed by previous runs, along with the names produced
+    for /ITER| operators.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+
+# Settings that change how files are processed, so must invalidate the index
+_FINGERPRINT_SETTINGS = ('all_match_root', 'copy', 'force_move', 'force_name',
+                         'force_name_fail_bad', 'iter_order', 'move_only',
+                         'output_folders', 'output_strategy', 'rename_only')
+
+
+def fingerprint(settings):
+    """
+    Produces a fingerprint of everything that determines how files are
+    processed, i.e. the schema, tag groups, and relevant settings.  If any of
+    it changes, files processed before must be processed again.
+
+    Parameters
+    ----------
+    settings: AutotagicalSettings
+        The settings for the run (including the schema and tag groups).
+
+    Returns
+    -------
+    str
+        A hex digest fingerprinting the settings.
+    """
+    data = {
+        'index_version': AutotagicalIndex.INDEX_VERSION,
+        'tag_formats': settings.schema.tag_formats,
+        'unnamed_patterns': settings.schema.unnamed_patterns,
+        'renaming_schemas': settings.schema.renaming_schemas,
+        'movement_schema': settings.schema.movement_schema,
+        # Tag groups print sorted, so their representation is stable
+        'tag_groups': str(settings.tag_groups),
+        'settings': {name: getattr(settings, name, None)
+                     for name in _FINGERPRINT_SETTINGS}
+    }
+    return hashlib.sha256(json.dumps(data, sort_keys=True)
+                          .encode('utf-8')).hexdigest()
+
+
+class AutotagicalIndex:
+    """
+    Remembers files processed by previous runs, along with the names produced
+    for /ITER| operators, in an SQLite database.  The database is only read
+    when the index is created.  Files passed through track() are written to
+    a table of their own as they go, so that they need not be kept in
+    memory, but the index itself is only changed by save().
+
+    Class Attributes
+    ----------------
+    INDEX_VERSION
+        Defines the current format of the index database.
+    INDEX_FILE_NAME
+        The default name of the index file (in the first output folder).
+    TRACK_BATCH_SIZE
+        The number of files passed through track() to hold before writing
+        their paths to the database.
+
+    Instance Attributes
+    -------------------
+    path: str
+        Absolute path to the index database.
+    __fingerprint: str
+        Fingerprint (see fingerprint()) of the current run.
+    __files: dict
+        A dictionary with paths as keys and (st_mtime_ns, st_size) tuples as
+        values, holding the files known to have been processed.
+    __seen: set of str
+        Paths of the files found unchanged during this run.
+    __produced_names: dict
+        Names produced for /ITER| operators, in the form used by
+        AutotagicalNamer.
+    __tracked: list of (str,)
+        Rows of paths (original and in each output folder) of the files
+        passed through track() and not yet written to the database.
+    __tracking: bool
+        True once paths of files passed through track() have been written to
+        the database during this run.
+
+    Methods
+    -------
+    __init__(path, run_fingerprint)
+        Constructor.  Loads the index at path, if it exists and matches the
+        fingerprint.
+    __load()
+        Loads the index database, if it matches the fingerprint.
+    is_unchanged(path, stat_result=None)
+        Determines whether a file has already been processed and is unchanged
+        since.
+    get_produced_names()
+        Returns the names produced for /ITER| operators by previous runs.
+    __paths_of(file, output_folders)
+        Returns the original path of a file and its paths in each output
+        folder.
+    __write_tracked()
+        Writes the paths held by track() to the database.
+    track(files, output_folders)
+        Yields files unchanged, remembering them as processed by this run.
+    __stat_rows(paths)
+        Yields the path, modification time, and size of each path that
+        exists.
+    save(file_list, produced_names, output_folders)
+        Saves the index, with the files processed by this run.
+    """
+
+    INDEX_VERSION = '1'
+    INDEX_FILE_NAME = '.autotagical_index.sqlite'
+    TRACK_BATCH_SIZE = 1024
+
+    def __init__(self, path, run_fingerprint):
+        """
+        Constructor.  Loads the index at path, if it exists and matches the
+        fingerprint.
+
+        Parameters
+        ----------
+        path: str
+            Path to the index database.
+        run_fingerprint: str
+            Fingerprint of the current run, as produced by fingerprint().
+
+        Returns
+        -------
+        AutotagicalIndex
+        """
+        self.path = os.path.abspath(path)
+        self.__fingerprint = run_fingerprint
+        self.__files = dict()
+        self.__seen = set()
+        self.__produced_names = dict()
+        self.__tracked = []
+        self.__tracking = False
+        if os.path.exists(self.path):
+            self.__load()
+
+    def __load(self):
+        """
+        Loads the index database, if it matches the fingerprint.  Otherwise,
+        the index is left empty, so that all files get processed.
+
+        Returns
+        -------
+        None
+        """
+        try:
+            connection = sqlite3.connect(self.path)
+            try:
+                stored = connection.execute(
+                    'SELECT value FROM meta WHERE key = ?',
+                    ('fingerprint',)).fetchone()
+                if not stored or stored[0] != self.__fingerprint:
+                    logging.info('Schema, tag groups, or settings changed '
+                                 'since index was saved.  Processing all '
+                                 'files.')
+                    return
+                self.__files = {
+                    path: (mtime_ns, size) for path, mtime_ns, size
+                    in connection.execute(
+                        'SELECT path, mtime_ns, size FROM files')}
+                self.__produced_names = {
+                    produced: {'occurrences': occurrences,
+                               'first_occurrence': first_occurrence}
+                    for produced, occurrences, first_occurrence
+                    in connection.execute(
+                        'SELECT produced, occurrences, first_occurrence '
+                        'FROM produced_names')}
+            finally:
+                connection.close()
+        except sqlite3.Error as err:
+            logging.warning('Could not read index at: %s\n%s\nProcessing all '
+                            'files.', self.path, str(err))
+            self.__files = dict()
+            self.__produced_names = dict()
+            return
+        logging.info('Loaded index of %s processed files from: %s',
+                     str(len(self.__files)), self.path)
+
+    def is_unchanged(self, path, stat_result=None):
+        """
+        Determines whether a file has already been processed and is unchanged
+        since (by modification time and size).  The index file itself is
+        always considered unchanged, so that it is never processed.
+
+        Parameters
+        ----------
+        path: str
+            The path to the file (including file name).
+        stat_result: os.stat_result (default None)
+            The result of stat() on the file, if already known.  Otherwise, it
+            is only stat'ed if it is in the index.
+
+        Returns
+        -------
+        bool
+            True if the file need not be processed, False otherwise.
+        """
+        path = os.path.abspath(path)
+        if path == self.path:
+            return True
+        known = self.__files.get(path)
+        if known is None:
+            return False
+        if stat_result is None:
+            try:
+                stat_result = os.stat(path)
+            except OSError:
+                return False
+        if (stat_result.st_mtime_ns, stat_result.st_size) != known:
+            return False
+        self.__seen.add(path)
+        return True
+
+    def get_produced_names(self):
+        """
+        Returns the names produced for /ITER| operators by previous runs, in
+        the form used by AutotagicalNamer.restore_produced_names().
+
+        Returns
+        -------
+        dict
+            The produced names.
+        """
+        return {produced: dict(produced_name) for produced, produced_name
+                in self.__produced_names.items()}
+
+    @staticmethod
+    def __paths_of(file, output_folders):
+        """
+        Returns the original path of a file and its paths in each output
+        folder.
+
+        Parameters
+        ----------
+        file: AutotagicalFile
+            The file, with its destination and name determined.
+        output_folders: list of str
+            The output folders the file is moved to.
+
+        Returns
+        -------
+        list of str
+            The paths.
+        """
+        return [file.original_path] + \
+               [os.path.join(out_folder, file.dest_folder, file.output_name)
+                for out_folder in output_folders]
+
+    def __write_tracked(self):
+        """
+        Writes the paths held by track() to the tracked table of the
+        database, emptying the table first if none have been written yet
+        this run (e.g. if a previous run was interrupted).  If they cannot be
+        written, they are dropped, so those files are simply processed again
+        by the next run.
+
+        Returns
+        -------
+        None
+        """
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            connection = sqlite3.connect(self.path)
+            try:
+                with connection:
+                    connection.execute('CREATE TABLE IF NOT EXISTS tracked '
+                                       '(path TEXT PRIMARY KEY)')
+                    if not self.__tracking:
+                        connection.execute('DELETE FROM tracked')
+                    connection.executemany(
+                        'INSERT OR IGNORE INTO tracked VALUES (?)',
+                        self.__tracked)
+                self.__tracking = True
+            finally:
+                connection.close()
+        except (OSError, sqlite3.Error) as err:
+            logging.error('Could not write to index at: %s\n%s', self.path,
+                          str(err))
+        self.__tracked = []
+
+    def track(self, files, output_folders):
+        """
+        Yields files unchanged, remembering their paths as processed by this
+        run, so that they are saved by save() without having to keep the
+        files themselves (e.g. when streaming).  Their destinations and names
+        must already be determined.  Paths are written to the database every
+        TRACK_BATCH_SIZE files, so memory use stays bounded.
+
+        Parameters
+        ----------
+        files: iterable of AutotagicalFile
+            The files being processed.
+        output_folders: list of str
+            The output folders the files are moved to.
+
+        Returns
+        -------
+        generator of AutotagicalFile
+            The same files, in order.
+        """
+        count = 0
+        for file in files:
+            self.__tracked.extend(
+                (os.path.abspath(path),)
+                for path in self.__paths_of(file, output_folders))
+            count += 1
+            if count % self.TRACK_BATCH_SIZE == 0:
+                self.__write_tracked()
+            yield file
+        if self.__tracked:
+            self.__write_tracked()
+
+    @staticmethod
+    def __stat_rows(paths):
+        """
+        Yields the (absolute) path, modification time, and size of each path
+        that exists.
+
+        Parameters
+        ----------
+        paths: iterable of str
+            The paths to stat.
+
+        Returns
+        -------
+        generator of (str, int, int)
+            A row for the files table for each path that exists.
+        """
+        for path in paths:
+            try:
+                stat_result = os.stat(path)
+            except OSError:
+                continue
+            yield (os.path.abspath(path), stat_result.st_mtime_ns,
+                   stat_result.st_size)
+
+    def save(self, file_list, produced_names, output_folders):
+        """
+        Saves the index, with the files processed by this run.  Files that
+        were neither found unchanged nor processed are forgotten.  Those
+        passed through track() are read back from the database, so they are
+        saved without being remembered by this index afterwards.
+
+        Parameters
+        ----------
+        file_list: list of AutotagicalFile
+            The files processed by this run (besides any passed through
+            track()).  Both their original paths and their paths in each
+            output folder are recorded, if they exist.
+        produced_names: dict
+            The names produced for /ITER| operators, as returned by
+            AutotagicalNamer.get_produced_names().
+        output_folders: list of str
+            The output folders the files were moved to.
+
+        Returns
+        -------
+        bool
+            True if saved successfully, False otherwise.
+        """
+        # Write paths still held by track(), so that all are in the database
+        if self.__tracked:
+            self.__write_tracked()
+        files = {path: self.__files[path] for path in self.__seen}
+        for path, mtime_ns, size in self.__stat_rows(
+                path for file in file_list
+                for path in self.__paths_of(file, output_folders)):
+            files[path] = (mtime_ns, size)
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            connection = sqlite3.connect(self.path)
+            try:
+                with connection:
+                    connection.execute('CREATE TABLE IF NOT EXISTS meta '
+                                       '(key TEXT PRIMARY KEY, value TEXT)')
+                    connection.execute('CREATE TABLE IF NOT EXISTS files '
+                                       '(path TEXT PRIMARY KEY, '
+                                       'mtime_ns INTEGER, size INTEGER)')
+                    connection.execute('CREATE TABLE IF NOT EXISTS '
+                                       'produced_names (produced TEXT PRIMARY '
+                                       'KEY, occurrences INTEGER, '
+                                       'first_occurrence TEXT)')
+                    connection.execute('CREATE TABLE IF NOT EXISTS tracked '
+                                       '(path TEXT PRIMARY KEY)')
+                    connection.execute('DELETE FROM files')
+                    connection.execute('DELETE FROM produced_names')
+                    connection.execute('INSERT OR REPLACE INTO meta VALUES '
+                                       '(?, ?)',
+                                       ('fingerprint', self.__fingerprint))
+                    connection.executemany(
+                        'INSERT INTO files VALUES (?, ?, ?)',
+                        [(path, mtime_ns, size) for path, (mtime_ns, size)
+                         in files.items()])
+                    # Only tracked by this run if anything was written
+                    if self.__tracking:
+                        connection.executemany(
+                            'INSERT OR REPLACE INTO files VALUES (?, ?, ?)',
+                            self.__stat_rows(
+                                path for path, in connection.execute(
+                                    'SELECT path FROM tracked')))
+                    connection.execute('DELETE FROM tracked')
+                    saved = connection.execute(
+                        'SELECT COUNT(*) FROM files').fetchone()[0]
+                    connection.executemany(
+                        'INSERT INTO produced_names VALUES (?, ?, ?)',
+                        [(produced, produced_name['occurrences'],
+                          produced_name['first_occurrence'])
+                         for produced, produced_name
+                         in produced_names.items()])
+            finally:
+                connection.close()
+        except (OSError, sqlite3.Error) as err:
+            logging.error('Could not save index at: %s\n%s', self.path,
+                          str(err))
+            return False
+        self.__files = files
+        self.__produced_names = produced_names
+        self.__tracking = False
+        logging.info('Saved index of %s processed files to: %s',
+                     str(saved), self.path)
+        return True
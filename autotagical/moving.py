@@ -8,26 +8,433 @@ This is *autotagical.moving*.
 It contains the various functions used to generate file organization based on a
 movement schema.
 
+---------
+Constants
+---------
+MOVEMENT_MEMO_SIZE
+    The default number of tag sets to remember walks of a movement schema for.
+BATCH_MIN_FILES
+    The default number of files from which determine_destination() walks a
+    movement schema for all of them at once (if NumPy is installed).
+
 ---------
 Functions
 ---------
+_compile_level(filter_level)
+    Compiles a filter level and all its sublevels.
+_check_tag_groups(levels, tag_groups)
+    Warns (once) of every tag group used by a compiled movement schema that is
+    not among the loaded tag groups.
+compile_movement_schema(movement_schema, tag_groups=None)
+    Compiles a movement schema, indexing the filters of every list of filter
+    levels in it, so that it need not be done for every file.
+_walk_filter_level(tag_set, filter_level, tag_groups)
+    Walks a filter level and all its sublevels for a set of tags, finding the
+    subfolders it and all sublevels contribute.
+_walk_movement_schema(tag_set, movement_schema, tag_groups)
+    Walks a movement schema for a set of tags, finding the subfolders to
+    organize a file with them into.
+_walk_levels_batch(batch, rows, levels)
+    Walks a list of filter levels for every tag set of a batch at once.
+_walk_batch(file_list, movement_schema, tag_groups)
+    Walks a movement schema for the distinct tag sets of a list of files all
+    at once.
+_render_path(subfolders, file, tag_groups)
+    Evaluates the format strings of subfolders for a file and joins them into
+    a path.
 process_filter_level(tag_array, filter_level, tag_groups)
     Takes a file's tag array and a filter level and determines the contribution
     to path that it and all sublevels contribute by operating recursively.
-generate_path(tag_array, movement_schema, tag_groups)
+generate_path(tag_array, movement_schema, tag_groups, memo=None,
+              memo_size=MOVEMENT_MEMO_SIZE)
     Takes a file's tag array and determines how to organize it according to a
     movement schema.
-determine_destination(file_list, movement_schema, tag_groups)
+iter_destinations(files, movement_schema, tag_groups,
+                  memo_size=MOVEMENT_MEMO_SIZE, memo=None)
+    Takes files one at a time and yields them once it is determined how they
+    should be organized in directories according to a movement schema.
+determine_destination(file_list, movement_schema, tag_groups,
+                      memo_size=MOVEMENT_MEMO_SIZE,
+                      batch_min_files=BATCH_MIN_FILES)
     Takes a list of files and processes how they should be organized in
     directories according to a movement schema.
+
+-------
+Classes
+-------
+MovementLevel
+    An immutable, compiled filter level.
+MovementLevels
+    An immutable, compiled list of filter levels (a movement schema or the
+    sublevels of a filter level), with the index of their filters.
 """
 
 import logging
 import os
-from autotagical.filtering import check_against_filter
-from autotagical.naming import substitute_operators, strip_iters
+from collections import OrderedDict, namedtuple
+try:
+    import numpy
+except ImportError:
+    numpy = None  # pylint: disable=C0103
+from autotagical.filtering import BATCH_AVAILABLE, FilterBatch, \
+                                  FilterError, check_against_filter, \
+                                  compile_filter, index_filters
+from autotagical.naming import check_format_string, compile_format_string
 from autotagical.schema import SchemaError
 
+MOVEMENT_MEMO_SIZE = 65536
+BATCH_MIN_FILES = 4096
+
+
+class MovementLevel(namedtuple('MovementLevel',
+                               ['filter', 'subfolder', 'sublevels'])):
+    """
+    An immutable, compiled filter level.  Produce these with
+    compile_movement_schema().
+
+    Attributes
+    ----------
+    filter: CompiledFilter
+        The filter of the level.
+    subfolder: str
+        The format string of the subfolder (left in parent directory if
+        empty).
+    sublevels: MovementLevels
+        The sublevels of the level.
+    """
+    __slots__ = ()
+
+
+class MovementLevels(namedtuple('MovementLevels', ['levels', 'index'])):
+    """
+    An immutable, compiled list of filter levels (a movement schema or the
+    sublevels of a filter level).  Produce these with
+    compile_movement_schema().
+
+    Attributes
+    ----------
+    levels: tuple of MovementLevel
+        The filter levels, in priority order.
+    index: FilterIndex
+        The index of the filters of the levels, used to only walk levels that
+        could match.
+    """
+    __slots__ = ()
+
+
+def _compile_level(filter_level):
+    """
+    Compiles a filter level and all its sublevels.  Subfolder names are
+    checked now, as only those of the levels a file is moved by are ever
+    rendered.
+
+    Parameters
+    ----------
+    filter_level: dict
+        A dictionary representing a filter level, of the form taken by
+        process_filter_level().
+
+    Returns
+    -------
+    MovementLevel
+        The compiled filter level.  Raises a SchemaError if a subfolder name
+        has a problem.
+    """
+    if filter_level['subfolder']:
+        check_format_string(filter_level['subfolder'])
+    return MovementLevel(compile_filter(filter_level['filter']),
+                         filter_level['subfolder'],
+                         compile_movement_schema(filter_level['sublevels']))
+
+
+def _check_tag_groups(levels, tag_groups):
+    """
+    Warns (once) of every tag group used by a compiled movement schema that is
+    not among the loaded tag groups.  Levels are only walked if their filters
+    could match, so this would otherwise only be reported for the files (if
+    any) reaching them.
+
+    Parameters
+    ----------
+    levels: MovementLevels
+        The compiled movement schema.
+    tag_groups: AutotagicalGroups
+        An AutotagicalGroups object that will be used to resolve group
+        operators.
+
+    Returns
+    -------
+    None
+    """
+    groups = set()
+    to_check = [levels]
+    while to_check:
+        for level in to_check.pop().levels:
+            groups.update(condition.tag_group for condition_set
+                          in level.filter.condition_sets
+                          for condition in condition_set.conditions
+                          if condition.tag_group is not None)
+            to_check.append(level.sublevels)
+    for group in sorted(groups):
+        # Warns if the group does not exist
+        tag_groups.group_ids(group)
+
+
+def compile_movement_schema(movement_schema, tag_groups=None):
+    """
+    Compiles a movement schema, indexing the filters of every list of filter
+    levels in it, so that it need not be done for every file.
+
+    Parameters
+    ----------
+    movement_schema: list of dict or MovementLevels
+        A list of dictionaries, each representing a single filter level, of
+        the form taken by generate_path().  If already compiled, it is
+        returned as is.
+    tag_groups: AutotagicalGroups or None (default None)
+        If given, the tag groups that will be used to resolve group operators,
+        which are checked for every group used by the schema.
+
+    Returns
+    -------
+    MovementLevels
+        The compiled movement schema.  Raises a SchemaError if a subfolder
+        name has a problem.
+    """
+    if isinstance(movement_schema, MovementLevels):
+        return movement_schema
+    levels = tuple(_compile_level(filter_level) for filter_level
+                   in movement_schema)
+    compiled = MovementLevels(levels, index_filters([level.filter for level
+                                                     in levels]))
+    if tag_groups is not None:
+        _check_tag_groups(compiled, tag_groups)
+    return compiled
+
+
+def _walk_filter_level(tag_set, filter_level, tag_groups):
+    """
+    Walks a filter level and all its sublevels for a set of tags, finding the
+    subfolders (unevaluated format strings) it and all sublevels contribute.
+    This depends only on the tags, so may be memoized by them.
+
+    Parameters
+    ----------
+    tag_set: frozenset of str
+        The tags on the file being moved (AutotagicalFile.tag_set).
+    filter_level: MovementLevel
+        The compiled filter level.
+    tag_groups: AutotagicalGroups
+        An AutotagicalGroups object that will be used to resolve group
+        operators.
+
+    Returns
+    -------
+    (full_match, subfolders): (bool, tuple of str)
+        full_match: bool
+            Whether or not a positive match was found at the lowest level.
+        subfolders: tuple of str
+            The format strings of the subfolders from the current level down.
+            Empty if no matches whatsoever.
+    """
+    # Check if it matches the (compiled) filter at this level
+    if not check_against_filter(tag_set, filter_level.filter, tag_groups):
+        # The file didn't even match current filters
+        return (False, ())
+
+    subfolder = filter_level.subfolder
+    here = (subfolder,) if subfolder else ()
+
+    # If there are no sub filter levels, it's supposed to terminate in the
+    # specified subfolder; if there isn't a subfolder name, it's supposed to
+    # go in the "current" (previous) folder
+    if not filter_level.sublevels.levels or not subfolder:
+        return (True, here)
+
+    # partial_sort becomes non-empty if some further matching is found but not
+    # a conclusive location.  It only gets set ONCE because filter order
+    # determines priority.
+    partial_sort = ()
+    sublevels = filter_level.sublevels
+    for position in sublevels.index.candidates(tag_set, tag_groups):
+        full_match, subfolders = _walk_filter_level(tag_set,
+                                                    sublevels.levels[position],
+                                                    tag_groups)
+        # If a positive match was found at a lower level, it's conclusive
+        if full_match:
+            return (True, here + subfolders)
+        if subfolders and not partial_sort:
+            partial_sort = subfolders
+
+    # If no exact match was found, use the first partial (because priority),
+    # if any
+    return (False, here + partial_sort)
+
+
+def _walk_movement_schema(tag_set, movement_schema, tag_groups):
+    """
+    Walks a movement schema for a set of tags, finding the subfolders
+    (unevaluated format strings) to organize a file with them into.  This
+    depends only on the tags, so may be memoized by them.
+
+    Parameters
+    ----------
+    tag_set: frozenset of str
+        The tags on the file being moved (AutotagicalFile.tag_set).
+    movement_schema: MovementLevels
+        The compiled movement schema.
+    tag_groups: AutotagicalGroups
+        An AutotagicalGroups object that will be used to resolve group
+        operators.
+
+    Returns
+    -------
+    (full_match, subfolders): (bool, tuple of str)
+        full_match: bool
+            Whether or not a positive match was found.
+        subfolders: tuple of str
+            The format strings of the subfolders.  Empty if no matches
+            whatsoever.
+    """
+    partial_sort = ()
+    # Only walk levels whose filters could match (in priority order)
+    for position in movement_schema.index.candidates(tag_set, tag_groups):
+        full_match, subfolders = _walk_filter_level(
+            tag_set, movement_schema.levels[position], tag_groups)
+        # If a positive match was found, done (because filter priority)
+        if full_match:
+            return (True, subfolders)
+        # A partial sorting was found; will be used if no exact match is found
+        if subfolders and not partial_sort:
+            partial_sort = subfolders
+    return (False, partial_sort)
+
+
+def _walk_levels_batch(batch, rows, levels):
+    """
+    Walks a list of filter levels (a movement schema or the sublevels of a
+    filter level) for every tag set of a batch at once, equivalently to
+    _walk_movement_schema() for each.  Each level's filter is checked against
+    all remaining tag sets together, and tag sets are dropped (from a boolean
+    array of those remaining) once a positive match is found for them.
+
+    Parameters
+    ----------
+    batch: FilterBatch
+        The batch of tag sets.
+    rows: list of int, numpy.ndarray, or None
+        The rows (in batch) of the tag sets to walk, or None to walk all of
+        them.
+    levels: MovementLevels
+        The compiled filter levels.
+
+    Returns
+    -------
+    dict
+        A dictionary with rows as keys and (full_match, subfolders) tuples, as
+        returned by _walk_movement_schema(), as values.  Rows with no matches
+        whatsoever are left out.
+    """
+    walks = dict()
+    # Rows not yet positively matched (which further levels must be checked
+    # for)
+    remaining = numpy.zeros(len(batch), dtype=bool)
+    remaining[slice(None) if rows is None else rows] = True
+    for level in levels.levels:
+        matched = batch.matching_rows(level.filter, remaining.nonzero()[0])
+        if not len(matched):
+            continue
+        subfolder = level.subfolder
+        here = (subfolder,) if subfolder else ()
+
+        # Positive matches are conclusive; otherwise only the first partial
+        # sort is kept (because filter priority)
+        full_match = numpy.zeros(len(batch), dtype=bool)
+        # As in _walk_filter_level(), levels without sublevels or a subfolder
+        # are conclusive
+        if not level.sublevels.levels or not subfolder:
+            walks.update(dict.fromkeys(matched.tolist(), (True, here)))
+            full_match[matched] = True
+        else:
+            below = _walk_levels_batch(batch, matched, level.sublevels)
+            for row in matched.tolist():
+                walk = (below[row][0], here + below[row][1]) \
+                    if row in below else (False, here)
+                if walk[0]:
+                    walks[row] = walk
+                    full_match[row] = True
+                elif row not in walks:
+                    walks[row] = walk
+        remaining &= ~full_match
+        if not remaining.any():
+            break
+    return walks
+
+
+def _walk_batch(file_list, movement_schema, tag_groups):
+    """
+    Walks a movement schema for the distinct tag sets of a list of files all
+    at once, with a FilterBatch.
+
+    Parameters
+    ----------
+    file_list: list of AutotagicalFile
+        The files to be moved.
+    movement_schema: MovementLevels
+        The compiled movement schema.
+    tag_groups: AutotagicalGroups
+        An AutotagicalGroups object that will be used to resolve group
+        operators.
+
+    Returns
+    -------
+    OrderedDict or None
+        A memo of walks of movement_schema, in the form taken by
+        generate_path(), with every tag set of the files.  None if a filter
+        was malformed, so the files must be walked one at a time (which
+        reports the problem only if one at a time would reach it).
+    """
+    tag_sets = list(OrderedDict.fromkeys(file.tag_set for file in file_list))
+    batch = FilterBatch(tag_sets, tag_groups)
+    try:
+        walks = _walk_levels_batch(batch, None, movement_schema)
+    except FilterError as err:
+        logging.debug('Malformed filter in batch (%s).  Walking movement '
+                      'schema one file at a time.', str(err))
+        return None
+    logging.debug('Walked movement schema for %s tag sets in a batch.',
+                  str(len(tag_sets)))
+    return OrderedDict((tag_set, walks.get(row, (False, ())))
+                       for row, tag_set in enumerate(tag_sets))
+
+
+def _render_path(subfolders, file, tag_groups):
+    """
+    Evaluates the format strings of subfolders for a file and joins them into
+    a path.
+
+    Parameters
+    ----------
+    subfolders: tuple of str
+        The format strings of the subfolders, as found by
+        _walk_movement_schema().
+    file: AutotagicalFile
+        An AutotagicalFile object, representing the file being moved.
+    tag_groups: AutotagicalGroups
+        An AutotagicalGroups object that will be used to resolve group
+        operators.
+
+    Returns
+    -------
+    str
+        The constructed file path.  Empty if there are no subfolders.
+    """
+    if not subfolders:
+        return ''
+    return os.path.join(*[compile_format_string(subfolder).render(file,
+                                                                  tag_groups)
+                          for subfolder in subfolders])
+
 
 def process_filter_level(file, filter_level, tag_groups):
     """
@@ -72,59 +479,14 @@ def process_filter_level(file, filter_level, tag_groups):
             The constructed file path from the current level down.  Empty if no
             matches whatsoever.
     """
+    full_match, subfolders = _walk_filter_level(file.tag_set,
+                                                _compile_level(filter_level),
+                                                tag_groups)
+    return (full_match, _render_path(subfolders, file, tag_groups))
 
-    # Check if it matches the filter at this level
-    if check_against_filter(file.tag_array, filter_level['filter'],
-                            tag_groups):
 
-        # Interpret format string
-        if filter_level['subfolder']:
-            subfolder_name = substitute_operators(strip_iters(
-                filter_level['subfolder']), file, tag_groups)
-        else:
-            subfolder_name = ''
-
-        # If there are no sub filter levels, it's supposed to terminate in the
-        # specified subfolder; if there isn't a subfolder name, it's supposed
-        # to go in the "current" (previous) folder
-        if not filter_level['sublevels'] or not filter_level['subfolder']:
-            return (True, subfolder_name)
-
-        # partial_sort becomes true if some further matching is found but not a
-        # conclusive location
-        partial_sort = False
-        # Check through all the filters (and recurse) to find a location
-        for level in filter_level['sublevels']:
-            # Recurse to check the entire filter tree
-
-            output = process_filter_level(file, level, tag_groups)
-            # If a positive match was found at a lower level, join the output
-            # and return True
-            if output[0]:
-                # Only concatenate if there is actually a subfolder
-                if output[1]:
-                    return (True, os.path.join(subfolder_name, output[1]))
-                # Otherwise return current path with a conclusive match
-                return (True, subfolder_name)
-
-            # If no positive match was found, but a partial match was, set
-            # partial_sort.  This only gets set ONCE because filter order
-            # determines priority (but a full match) would still be preferred
-            if output[1] and not partial_sort:
-                partial_sort = output[1]
-        # If no exact match was found but a partial was, use the first partial
-        # (because priority)
-        if partial_sort:
-            return (False, os.path.join(subfolder_name, partial_sort))
-
-        # Otherwise, no matches were found at lower directories
-        return (False, subfolder_name)
-
-    # If we got here, it means that the file didn't even match current filters
-    return (False, '')
-
-
-def generate_path(file, movement_schema, tag_groups):
+def generate_path(file, movement_schema, tag_groups, memo=None,
+                  memo_size=MOVEMENT_MEMO_SIZE):
     """
     Takes a file and determines how to organize it according to a movement
     schema.
@@ -133,9 +495,11 @@ def generate_path(file, movement_schema, tag_groups):
     ----------
     file: AutotagicalFile
         An AutotagicalFile object, representing the file to be moved.
-    movement_schema: list of dict
+    movement_schema: list of dict or MovementLevels
         A list of dictionaries, each with strings for keys, representing a
-        single filter level.  It should have the following form:
+        single filter level, or the same compiled by
+        compile_movement_schema() (so that it is not compiled for every
+        file).  It should have the following form:
             [
                 {
                     "filter": list of str
@@ -157,6 +521,12 @@ def generate_path(file, movement_schema, tag_groups):
     tag_groups: AutotagicalGroups
         An AutotagicalGroups object that will be used to resolve group
         operators.
+    memo: OrderedDict or None (default None)
+        If given, a memo of walks of movement_schema, keyed by tag set, which
+        is used and updated (least recently used first).  It must only ever be
+        used with the same movement_schema and tag_groups.
+    memo_size: int (default MOVEMENT_MEMO_SIZE)
+        The maximum number of tag sets to remember in memo.
 
     Returns
     -------
@@ -168,30 +538,35 @@ def generate_path(file, movement_schema, tag_groups):
         path: str
             The constructed file path.  Empty if no matches whatsoever.
     """
-    # partial_sort becomes true if some matching is found but not a conclusive
-    # location
-    partial_sort = False
-
     # Completely empty movement_schema.  This is bad.
-    if not movement_schema:
+    movement_schema = compile_movement_schema(movement_schema)
+    if not movement_schema.levels:
         logging.error('Completely empty movement schema!')
         raise SchemaError('Completely empty movement schema!')
 
-    # For every movement schema
-    for filter_level in movement_schema:
-        # Try to sort according to it
-        output = process_filter_level(file, filter_level, tag_groups)
-        # If a positive match was found, done (because filter priority)
-        if output[0]:
-            logging.debug('Good match for moving tags: %s',
-                          str(file.tag_array))
-            return (False, output[1])
-        # A partial sorting was found; will be used if no exact match is found
-        if output[1] and not partial_sort:
-            partial_sort = output[1]
+    # Walk the schema, or remember how it was walked for the same tags
+    if memo is None:
+        walk = _walk_movement_schema(file.tag_set, movement_schema, tag_groups)
+    else:
+        walk = memo.get(file.tag_set)
+        if walk is None:
+            walk = _walk_movement_schema(file.tag_set, movement_schema,
+                                         tag_groups)
+            memo[file.tag_set] = walk
+            if len(memo) > memo_size:
+                memo.popitem(last=False)
+        else:
+            memo.move_to_end(file.tag_set)
+    full_match, subfolders = walk
+
+    # Only the subfolder names depend on more than the tags
+    if full_match:
+        logging.debug('Good match for moving tags: %s', str(file.tag_array))
+        return (False, _render_path(subfolders, file, tag_groups))
 
     # If we're here, we either found zero matches or a partial sort
-    if partial_sort:
+    if subfolders:
+        partial_sort = _render_path(subfolders, file, tag_groups)
         logging.warning('Failed to match a fully specified location for tags:'
                         '\n%s\nSorted only to:\n%s\nThis is bad practice.  '
                         'Add a /*| operator filter at that level if you '
@@ -203,37 +578,48 @@ def generate_path(file, movement_schema, tag_groups):
     return (True, '')
 
 
-def determine_destination(file_list, movement_schema, tag_groups):
+def iter_destinations(files, movement_schema, tag_groups,
+                      memo_size=MOVEMENT_MEMO_SIZE, memo=None):
     """
-    Takes a list of files and processes how they should be organized in
-    directories according to a schema.
+    Takes files one at a time and yields them once it is determined how they
+    should be organized in directories according to a schema, so that files
+    may be streamed.  How the schema is walked is remembered for the most
+    recently seen tag sets, so files with the same tags only have their
+    subfolder names evaluated.
 
     Parameters
     ----------
-    file_list: list of AutotagicalFile
-        A list of AutotagicalFile objects, each representing a file to be moved
-    movement_schema: list
+    files: iterable of AutotagicalFile
+        AutotagicalFile objects, each representing a file to be moved.
+    movement_schema: list or MovementLevels
         A list of movement schema in the form provided by
-        AutotagicalSchema.movement_schema
+        AutotagicalSchema.movement_schema, or the same compiled by
+        compile_movement_schema().  It is compiled only once.
     tag_groups: AutotagicalGroups
         An AutotagicalGroups object that will be used to resolve group
         operators.
+    memo_size: int (default MOVEMENT_MEMO_SIZE)
+        The maximum number of tag sets to remember walks of the schema for (0
+        to not remember any).
+    memo: OrderedDict or None (default None)
+        Walks of the schema already known (e.g. from walking it for a whole
+        batch), in the form taken by generate_path(), or None to start with
+        none.
 
     Returns
     -------
-    list of AutotagicalFile
-        A list of AutotagicalFile objects, each representing a file (will
-        include all original files).  The 'move_failed' and 'dest_folder'
+    generator of AutotagicalFile
+        The same files, in order.  The 'move_failed' and 'dest_folder'
         attributes will have been set properly.
     """
+    if memo is None and memo_size > 0:
+        memo = OrderedDict()
+    movement_schema = compile_movement_schema(movement_schema, tag_groups)
 
-    # Initialize return list
-    return_list = []
-
-    # Loop through all provided files
-    for file in file_list:
+    for file in files:
         # Determine the appropriate path
-        output = generate_path(file, movement_schema, tag_groups)
+        output = generate_path(file, movement_schema, tag_groups, memo,
+                               memo_size)
 
         # Set values accordingly
         file.dest_folder = output[1]
@@ -244,8 +630,53 @@ def determine_destination(file_list, movement_schema, tag_groups):
             logging.warning('File did not match any moving schema:\n%s',
                             str(file))
 
-        # Append it to the list
-        return_list.append(file)
+        yield file
+
+
+def determine_destination(file_list, movement_schema, tag_groups,
+                          memo_size=MOVEMENT_MEMO_SIZE,
+                          batch_min_files=BATCH_MIN_FILES):
+    """
+    Takes a list of files and processes how they should be organized in
+    directories according to a schema.  How the schema is walked is
+    remembered for the most recently seen tag sets, so files with the same
+    tags only have their subfolder names evaluated.  For many files (if NumPy
+    is installed), the schema is instead walked for all of their tag sets at
+    once, checking each filter level against the whole batch.
+
+    Parameters
+    ----------
+    file_list: list of AutotagicalFile
+        A list of AutotagicalFile objects, each representing a file to be moved
+    movement_schema: list or MovementLevels
+        A list of movement schema in the form provided by
+        AutotagicalSchema.movement_schema, or the same compiled by
+        compile_movement_schema().  It is compiled only once.
+    tag_groups: AutotagicalGroups
+        An AutotagicalGroups object that will be used to resolve group
+        operators.
+    memo_size: int (default MOVEMENT_MEMO_SIZE)
+        The maximum number of tag sets to remember walks of the schema for (0
+        to not remember any).
+    batch_min_files: int or None (default BATCH_MIN_FILES)
+        The number of files from which to walk the schema for all of them at
+        once, or None to never do so.  Ignored if NumPy is not installed.
 
-    # Return the list
-    return return_list
+    Returns
+    -------
+    list of AutotagicalFile
+        A list of AutotagicalFile objects, each representing a file (will
+        include all original files).  The 'move_failed' and 'dest_folder'
+        attributes will have been set properly.
+    """
+    movement_schema = compile_movement_schema(movement_schema, tag_groups)
+    if BATCH_AVAILABLE and batch_min_files is not None \
+       and movement_schema.levels and file_list \
+       and len(file_list) >= batch_min_files:
+        walks = _walk_batch(file_list, movement_schema, tag_groups)
+        if walks is not None:
+            # Every tag set is walked, so none need be forgotten
+            return list(iter_destinations(file_list, movement_schema,
+                                          tag_groups, len(walks), walks))
+    return list(iter_destinations(file_list, movement_schema, tag_groups,
+                                  memo_size))
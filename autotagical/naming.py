@@ -8,13 +8,36 @@ This is *autotagical.naming*.
 It contains the various functions and classes used to parse and generate names
 based on renaming schemas in autotagical.
 
+---------
+Constants
+---------
+_FORMAT_TOKEN_REGEX
+    A compiled regex for finding the /?TIG|, /FILE|, /TAGS|, /EXT|, and /#|
+    operators in a format string.  Not intended for use outside of this
+    module.
+_COMPILED_TEMPLATES
+    Cache of compiled format strings, keyed by their source strings.  Not
+    intended for use outside of this module.
+SELECTION_CACHE_SIZE
+    The number of tag sets each AutotagicalNamer remembers the selected
+    renaming schema for.
+STREAM_WINDOW
+    The default number of files AutotagicalNamer.stream_names() holds back
+    waiting for others with the same name.
+
 ---------
 Functions
 ---------
-_tig_operator_sub(tag_array, tag_groups, match_obj)
-    Takes a tag array, tag groups, and a regex match object (from a TIG
-    operator match) and returns the string to subsitute it with.  For use with
-    re.sub().
+_compile_segment(text)
+    Parses text without conditionals into a tuple of FormatNodes.
+_compile_nodes(format_string)
+    Parses a format string without /ITER| operators into a tuple of
+    FormatNodes.
+compile_format_string(format_string)
+    Parses a format string into a (cached) FormatTemplate.
+check_format_string(format_string)
+    Parses a format string and reports the problems rendering it without
+    /ITER| operators would find for any file.
 simplify_to_conditionals(format_string)
     Takes a format string and simplifies the "convenience" operators to simply
     be conditionals.
@@ -33,39 +56,344 @@ substitute_operators(format_string, file, tag_groups)
 -------
 Classes
 -------
+FormatNode
+    An immutable, pre-parsed piece of a format string.
+FormatTemplate
+    An immutable, pre-parsed format string, which can be rendered for a file
+    in a single pass.
 AutotagicalNamer
     Names files according to a schema.
 """
 
 import logging
+import os
 import re
 import sys
+from collections import namedtuple, OrderedDict
 from autotagical.filtering import check_against_filter, \
-                                  check_against_condition_set
+                                  check_against_condition_set, \
+                                  compile_condition_set, compile_filter, \
+                                  index_filters
 from autotagical.schema import SchemaError
 
+# Regex for finding the operators left once conditionals are parsed out.
+_FORMAT_TOKEN_REGEX = re.compile(r'/\?TIG\|(?P<group>[^/]+?)/\||'
+                                 r'(?P<operator>/FILE\||/TAGS\||/EXT\||/#\|)')
+
+# Cache of every format string compiled so far, so each is only parsed once.
+_COMPILED_TEMPLATES = dict()
 
-def _tig_operator_sub(tag_array, tag_groups, match_obj):
+SELECTION_CACHE_SIZE = 65536
+
+STREAM_WINDOW = 4096
+
+
+class FormatNode(namedtuple('FormatNode', ['kind', 'value', 'true_nodes',
+                                           'false_nodes'])):
     """
-    Takes a tag array, tag groups, and a regex match object (from a TIG
-    operator match) and returns the string to subsitute it with.  For use with
-    re.sub().
+    An immutable, pre-parsed piece of a format string.  Produce these with
+    compile_format_string().
+
+    Class Attributes
+    ----------------
+    LITERAL, CONDITIONAL, TIG, FILE, TAGS, EXT, OCCURRENCE: str
+        The kinds of node.
+
+    Attributes
+    ----------
+    kind: str
+        One of the kinds of node above.
+    value: str, CompiledConditionSet, or None
+        The text of a LITERAL node, the compiled condition set of a
+        CONDITIONAL node, or the group name of a TIG node.
+    true_nodes, false_nodes: tuple of FormatNode or None
+        The nodes to render if the condition set of a CONDITIONAL node is or
+        is not matched.  These never contain CONDITIONAL nodes.
+    """
+    __slots__ = ()
+
+    LITERAL = 'literal'
+    CONDITIONAL = 'conditional'
+    TIG = 'tig'
+    FILE = 'file'
+    TAGS = 'tags'
+    EXT = 'ext'
+    OCCURRENCE = 'occurrence'
+
+
+# Map of simple operators to the kind of node they compile to
+_OPERATOR_NODES = {
+    '/FILE|': FormatNode(FormatNode.FILE, None, None, None),
+    '/TAGS|': FormatNode(FormatNode.TAGS, None, None, None),
+    '/EXT|': FormatNode(FormatNode.EXT, None, None, None),
+    '/#|': FormatNode(FormatNode.OCCURRENCE, None, None, None)
+}
+
+
+class FormatTemplate(namedtuple('FormatTemplate',
+                                ['nodes', 'iter_nodes', 'stray_occurrence',
+                                 'missing_occurrence', 'source'])):
+    """
+    An immutable, pre-parsed format string, which can be rendered for a file
+    in a single pass.  Produce these with compile_format_string().
+
+    Attributes
+    ----------
+    nodes: tuple of FormatNode
+        The nodes of the format string with all /ITER| operators stripped.
+    iter_nodes: tuple of FormatNode
+        The nodes of the format string with all /ITER| operators evaluated,
+        leaving OCCURRENCE nodes for the /#| operator.
+    stray_occurrence: bool
+        Whether a /#| operator occurs outside of an /ITER| operator.
+    missing_occurrence: bool
+        Whether the format string lacks any /#| operator.
+    source: str
+        The format string as originally written.
+
+    Methods
+    -------
+    render(file, tag_groups, occurrence=None)
+        Fully evaluates all operators for a file.
+    """
+    __slots__ = ()
+
+    def render(self, file, tag_groups, occurrence=None):
+        """
+        Fully evaluates all operators for a file, equivalently to calling
+        substitute_operators() on the output of strip_iters() (if occurrence
+        is None) or evaluate_iters() (otherwise).
+
+        Parameters
+        ----------
+        file: AutotagicalFile
+            The file to be considered.
+        tag_groups: AutotagicalGroups
+            An AutotagicalGroups object, representing known tag groups.
+        occurrence: int or None (default None)
+            Number of times the file name has been produced (will be inserted
+            for the /#| occurrence operator), or None to strip all /ITER|
+            operators.
+
+        Returns
+        -------
+        str
+            The determined output filename.
+        """
+        if occurrence is None:
+            # Check that the occurrence operator does not occur outside of iter
+            if self.stray_occurrence:
+                logging.error('Encountered /#| occurrence operator outside of '
+                              '/ITER| operator!  This will lead to files being '
+                              'renamed properly.')
+                raise SchemaError('Occurrence /#| operator outside of /ITER|!')
+            nodes = self.nodes
+        else:
+            # If there aren't any /#|'s, this is bad practice.
+            if self.missing_occurrence:
+                logging.warning('Encountered format string with /ITER| '
+                                'operator but no /#|.  This is bad and will '
+                                'lead to files not being renamed/moved '
+                                'properly: %s', self.source)
+            nodes = self.iter_nodes
+
+        # If the format string is completely empty, something is horribly
+        # wrong.
+        if not nodes:
+            logging.error('Completely empty format string!')
+            raise SchemaError('Completely empty format string!')
+
+        # Render every node (or the chosen branch of conditionals) in order
+        parts = []
+        kept_tags = False
+        kept_extension = False
+        for node in nodes:
+            if node.kind == FormatNode.CONDITIONAL:
+                if check_against_condition_set(file.tag_set, node.value,
+                                               tag_groups):
+                    branch = node.true_nodes
+                else:
+                    branch = node.false_nodes
+            else:
+                branch = (node,)
+            for leaf in branch:
+                kind = leaf.kind
+                if kind == FormatNode.LITERAL:
+                    parts.append(leaf.value)
+                elif kind == FormatNode.TIG:
+                    parts.append(tag_groups.tag_in_group(file.tag_array,
+                                                         leaf.value))
+                elif kind == FormatNode.FILE:
+                    parts.append(file.name)
+                elif kind == FormatNode.TAGS:
+                    kept_tags = True
+                    parts.append(file.tags)
+                elif kind == FormatNode.EXT:
+                    kept_extension = True
+                    parts.append(file.extension)
+                else:
+                    parts.append(str(occurrence))
+        to_return = ''.join(parts)
+
+        # Warn if no extension or no tags
+        if not kept_tags:
+            logging.warning('Renamed a file without preserving tags!  This '
+                            'will lead to loss of tagging.  Based on format '
+                            'string: %s', self.source)
+        if not kept_extension:
+            logging.warning('Renamed a file without preserving original '
+                            'extension, based on format string: %s',
+                            self.source)
+
+        # Check if there are any /'s left, as this is a very bad sign.
+        if '/' in to_return:
+            logging.error('A "/" is still in the format string after reducing '
+                          'all operators!  This probably means there was a '
+                          'problem with the format string!\nFormat String: '
+                          '%s\nOutput: %s', self.source, to_return)
+            sys.exit()
+
+        # If the operators evaluated to a completely blank string, this is
+        # bad, because can't use that
+        if not to_return:
+            logging.error('Completely empty format string after operators: %s',
+                          self.source)
+            raise SchemaError('Completely empty format string after '
+                              'operators: ' + self.source)
+
+        return to_return
+
+
+def _compile_segment(text):
+    """
+    Parses text without conditionals into a tuple of FormatNodes.
 
     Parameters
     ----------
-    tag_array: list of str
-        List of strings, each representing a tag on the file.
-    tag_groups: AutotagicalGroups
-        An AutotagicalGroups object representing known tag groups.
-    match_obj: Regex Match Object
-        The match being subsituted.
+    text: str
+        Text which may have tag in group /?TIG|, file name /FILE|, tags
+        /TAGS|, extension /EXT|, and/or occurrence /#| operators in it.
 
     Returns
     -------
-    str
-        The tag in group that matches.
+    tuple of FormatNode
+        The parsed nodes, in order.
+    """
+    nodes = []
+    position = 0
+    for match in _FORMAT_TOKEN_REGEX.finditer(text):
+        if match.start() > position:
+            nodes.append(FormatNode(FormatNode.LITERAL,
+                                    text[position:match.start()], None, None))
+        if match.group('group') is not None:
+            nodes.append(FormatNode(FormatNode.TIG, match.group('group'),
+                                    None, None))
+        else:
+            nodes.append(_OPERATOR_NODES[match.group('operator')])
+        position = match.end()
+    if position < len(text):
+        nodes.append(FormatNode(FormatNode.LITERAL, text[position:], None,
+                                None))
+    return tuple(nodes)
+
+
+def _compile_nodes(format_string):
+    """
+    Parses a format string without /ITER| operators into a tuple of
+    FormatNodes, simplifying convenience operators into conditionals first.
+
+    Parameters
+    ----------
+    format_string: str
+        The format string may have tag /?T|, group /?G|, conditional /?|, tag
+        in group /?TIG|, file name /FILE|, tags /TAGS|, extension /EXT|,
+        and/or occurrence /#| operators in it.
+
+    Returns
+    -------
+    tuple of FormatNode
+        The parsed nodes, in order.
     """
-    return tag_groups.tag_in_group(tag_array, match_obj.group('group'))
+    simplified = simplify_to_conditionals(format_string)
+    nodes = []
+    position = 0
+    for match in AutotagicalNamer.conditional_regex.finditer(simplified):
+        nodes.extend(_compile_segment(simplified[position:match.start()]))
+        nodes.append(FormatNode(
+            FormatNode.CONDITIONAL,
+            compile_condition_set(match.group('condition_set')),
+            _compile_segment(match.group('true_sub')),
+            _compile_segment(match.group('false_sub'))))
+        position = match.end()
+    nodes.extend(_compile_segment(simplified[position:]))
+    return tuple(nodes)
+
+
+def compile_format_string(format_string):
+    """
+    Parses a format string into a (cached) FormatTemplate.  This never fails;
+    problems with the format string are only reported once rendered.
+
+    Parameters
+    ----------
+    format_string: str
+        The format string may have tag /?T|, group /?G|, conditional /?|, tag
+        in group /?TIG|, file name /FILE|, tags /TAGS|, extension /EXT|,
+        and/or /ITER| operators in it.
+
+    Returns
+    -------
+    FormatTemplate
+        The parsed format string.
+    """
+    compiled = _COMPILED_TEMPLATES.get(format_string)
+    if compiled is None:
+        stripped = AutotagicalNamer.iter_regex.sub('', format_string)
+        iterated = AutotagicalNamer.iter_regex.sub(r'\g<iter_sub>',
+                                                   format_string)
+        compiled = FormatTemplate(nodes=_compile_nodes(stripped),
+                                  iter_nodes=_compile_nodes(iterated),
+                                  stray_occurrence='/#|' in stripped,
+                                  missing_occurrence='/#|' not in iterated,
+                                  source=format_string)
+        _COMPILED_TEMPLATES[format_string] = compiled
+    return compiled
+
+
+def check_format_string(format_string):
+    """
+    Parses a format string into a (cached) FormatTemplate and reports the
+    problems that rendering it without /ITER| operators would find for any
+    file (e.g. for subfolder names), so that they are found before any file
+    is processed.
+
+    Parameters
+    ----------
+    format_string: str
+        The format string to check.
+
+    Returns
+    -------
+    FormatTemplate
+        The parsed format string.  Raises a SchemaError if it has a problem.
+    """
+    template = compile_format_string(format_string)
+    if template.stray_occurrence:
+        logging.error('Encountered /#| occurrence operator outside of /ITER| '
+                      'operator in format string: %s', format_string)
+        raise SchemaError('Occurrence /#| operator outside of /ITER|!')
+    if not template.nodes:
+        logging.error('Completely empty format string: %s', format_string)
+        raise SchemaError('Completely empty format string!')
+    for node in template.nodes:
+        if node.kind == FormatNode.LITERAL and '/' in node.value:
+            logging.error('A "/" is in the format string outside of any '
+                          'operator!  This probably means there was a problem '
+                          'with the format string!\nFormat String: %s',
+                          format_string)
+            raise SchemaError('Unknown operator in format string: ' +
+                              format_string)
+    return template
 
 
 def simplify_to_conditionals(format_string):
@@ -195,7 +523,8 @@ def substitute_operators(format_string, file, tag_groups):
     """
     Takes a format string without /ITER| operators, an AutotagicalFile object,
     and an AutotagicalGroups object, and fully evaluates all operators within
-    the format string.
+    the format string.  The format string is compiled (and cached) by
+    compile_format_string(), so it is only ever parsed once.
 
     Parameters
     ----------
@@ -214,53 +543,8 @@ def substitute_operators(format_string, file, tag_groups):
         The determined output filename.
     """
 
-    # If the format string is completely empty, something is horribly wrong.
-    if not format_string:
-        logging.error('Completely empty format string!')
-        raise SchemaError('Completely empty format string!')
-
-    # First handle all conditionals by simplifying then evaluating
-    to_return = evaluate_conditionals(simplify_to_conditionals(format_string),
-                                      file.tag_array, tag_groups)
-
-    # Handle tag in group operator
-    # Have to use a lambda function to wrap _tig_operator_sub, since re.sub
-    # can only pass one argument.
-    to_return = AutotagicalNamer.tig_regex.sub(
-        lambda a: _tig_operator_sub(file.tag_array, tag_groups, a),
-        to_return)
-
-    # Warn if no extension or no tags
-    if '/TAGS|' not in to_return:
-        logging.warning('Renamed a file without preserving tags!  This will '
-                        'lead to loss of tagging.  Based on format string: %s',
-                        format_string)
-    if '/EXT|' not in to_return:
-        logging.warning('Renamed a file without preserving original extension,'
-                        ' based on format string: %s', format_string)
-
-    # Anything that is left are simple replacement operators, so sub them all
-    to_return = to_return.replace('/EXT|', file.extension)
-    to_return = to_return.replace('/TAGS|', file.tags)
-    to_return = to_return.replace('/FILE|', file.name)
-
-    # Check if there are any /'s left, as this is a very bad sign.
-    if '/' in to_return:
-        logging.error('A "/" is still in the format string after reducing '
-                      'all operators!  This probably means there was a '
-                      'problem with the format string!\nFormat String: %s\n'
-                      'Output: %s', format_string, to_return)
-        sys.exit()
-
-    # If the operators evaluated to a completely blank string, this is bad,
-    # because can't use that
-    if not to_return:
-        logging.error('Completely empty format string after operators: %s',
-                      format_string)
-        raise SchemaError('Completely empty format string after operators: ' +
-                          format_string)
-
-    return to_return
+    # Parse (once) and render in a single pass
+    return compile_format_string(format_string).render(file, tag_groups)
 
 
 class AutotagicalNamer:
@@ -269,6 +553,9 @@ class AutotagicalNamer:
 
     Class Attributes
     ----------------
+    ITER_ORDERS: tuple of str
+        The orders files with the same name may be numbered in for /ITER|
+        operators.
     tag_regex: Regular Expression Object
         Compiled regex for finding /?T| tag operators
     group_regex: Regular Expression Objects
@@ -293,6 +580,11 @@ class AutotagicalNamer:
                                 Number of times this name has been produced
                             'first_occurrence': str
                                 Full path to the first file to be named this
+                            'first_file': AutotagicalFile
+                                The first file to be named this, so that it
+                                can be renamed with /ITER| operators without
+                                searching for it.  Absent for names restored
+                                from a previous run.
                         }
                 ...
             }
@@ -309,12 +601,31 @@ class AutotagicalNamer:
                         'renaming format string containing operators'
                 }
             ]
+    __decision_table: list of (int, CompiledFilter)
+        The index and compiled filter of each renaming schema that could ever
+        be the first to match, in priority order.  Schemas with the same
+        filter as a previous one and schemas after one that always matches
+        are left out.
+    __filter_index: FilterIndex
+        Index of the filters in __decision_table, used to skip those that
+        cannot match.
+    __selection_cache: OrderedDict
+        The index of the schema selected (or None if none) for recently seen
+        tag sets (least recently used first).
+    __selection_groups: AutotagicalGroups
+        The tag groups __selection_cache is valid for.
+    __selection_hits, __selection_misses: int
+        Number of times a schema was selected from and without the cache.
 
     Methods
     -------
     __init__(renaming_schema, unnamed_patterns)
         Constructor.  Compiles necessary regexes and initializes attributes.
 
+    __compile_decision_table(renaming_schemas)
+        Compiles the filters of renaming schemas into a table of those that
+        could ever be the first to match.
+
     check_if_unnamed(file_name)
         Takes a (tagless) file name and determines whether or not it matches
         any of the unnamed patterns known by the class.
@@ -322,11 +633,51 @@ class AutotagicalNamer:
     find_format_string(tag_array, tag_groups)
         Takes a file's tag array and finds the first matching renaming schema.
 
-    determine_names(file_list, tag_groups, force_name=False)
+    get_selection_stats()
+        Returns statistics on the cache of renaming schemas selected by
+        find_format_string().
+
+    name_file(file, tag_groups, force_name=False, force_fail_bad=False)
+        Takes a single file and determines its name without /ITER| operators.
+
+    __assign_name(file, template, iterless_name, tag_groups)
+        Names a file, invoking /ITER| operators if its name has been produced
+        before.
+
+    determine_names(file_list, tag_groups, force_name=False,
+                    force_fail_bad=False, clear_occurrences=False,
+                    iter_order='scan')
         Takes a list of files and processes how they should be renamed
         according to loaded schemas.
+
+    assign_names(named, tag_groups, iter_order='scan')
+        Names files grouped by the name they produced without /ITER|
+        operators.
+
+    stream_names(files, tag_groups, force_name=False, force_fail_bad=False,
+                 iter_order='scan', window=STREAM_WINDOW)
+        Takes files one at a time and yields them once it is determined how
+        they should be renamed, holding back a bounded number of files for
+        /ITER| operators.
+
+    __release(produced, group, tag_groups, iter_order)
+        Names a group of held back files with the same name, after which
+        they are never renamed again.
+
+    __iter_sort_key(iter_order)
+        Returns the key to sort files with the same name by for /ITER|
+        operators.
+
+    get_produced_names()
+        Returns the file names produced so far (for /ITER| operators).
+
+    restore_produced_names(produced_names)
+        Restores file names produced by a previous run (e.g. from an
+        AutotagicalIndex), so that /ITER| operators continue from them.
     """
 
+    ITER_ORDERS = ('scan', 'path', 'mtime')
+
     # Regexes used to evaluate the more complx operators
     tag_regex = re.compile(r'(?:/\?T\|(?P<tag>[^/]+?)/\|)')
     group_regex = re.compile(r'(?:/\?G\|(?P<group>[^/]+?)/\|)')
@@ -364,8 +715,16 @@ class AutotagicalNamer:
             logging.error('Completely empty unnamed file schema!')
             raise SchemaError('Completely empty unnamed file schema!')
 
-        # Store schema and compile regexes
+        # Store schema, compile its filters, and compile regexes
         self.__renaming_schemas = renaming_schemas
+        self.__decision_table = self.__compile_decision_table(
+            renaming_schemas)
+        self.__filter_index = index_filters(
+            [compiled_filter for _, compiled_filter in self.__decision_table])
+        self.__selection_cache = OrderedDict()
+        self.__selection_groups = None
+        self.__selection_hits = 0
+        self.__selection_misses = 0
         for pattern in unnamed_patterns:
             try:
                 self.__unnamed_patterns.append(re.compile(pattern))
@@ -373,6 +732,40 @@ class AutotagicalNamer:
                 logging.warning('Regex error unnamed pattern: %s\n%s',
                                 pattern, str(err))
 
+    @staticmethod
+    def __compile_decision_table(renaming_schemas):
+        """
+        Compiles the filters of renaming schemas into a table of those that
+        could ever be the first to match, in priority order.
+
+        Parameters
+        ----------
+        renaming_schemas: list
+            List of the sort stored in AutotagicalSchema.renaming_schemas
+
+        Returns
+        -------
+        list of (int, CompiledFilter)
+            The index and compiled filter of each schema that could be
+            selected.
+        """
+        table = []
+        seen = set()
+        for index, schema in enumerate(renaming_schemas):
+            compiled_filter = compile_filter(schema['filter'])
+            # A filter seen before would always have matched already
+            if compiled_filter.source in seen:
+                continue
+            seen.add(compiled_filter.source)
+            table.append((index, compiled_filter))
+            # Nothing after a filter that always matches can be selected
+            if any(condition_set.conditions and
+                   all(condition.wildcard and not condition.negated
+                       for condition in condition_set.conditions)
+                   for condition_set in compiled_filter.condition_sets):
+                break
+        return table
+
     def check_if_unnamed(self, file_name):
         """
         Takes a (tagless) file name and determines whether or not it matches
@@ -402,8 +795,9 @@ class AutotagicalNamer:
 
         Parameters
         ----------
-        tag_array: list of str
-            A list of strings, each representing a tag on the file.
+        tag_array: list of str or frozenset of str
+            A list of strings, each representing a tag on the file.  Passing a
+            set (e.g. AutotagicalFile.tag_set) makes checks faster.
 
         tag_groups: AutotagicalGroups
             Known tag groups.
@@ -413,20 +807,216 @@ class AutotagicalNamer:
         False or str
             False if no matching schema, otherwise format string.
         """
-        # Check if tags match any renaming filter and return the first that
-        # does (because priority)
-        for schema in self.__renaming_schemas:
-            if check_against_filter(tag_array, schema['filter'], tag_groups):
-                return schema['format_string']
-        return False
+        # Selection only depends on the tags (and groups), so remember it
+        if tag_groups is not self.__selection_groups:
+            self.__selection_cache = OrderedDict()
+            self.__selection_groups = tag_groups
+        tag_set = tag_array if isinstance(tag_array, frozenset) \
+            else frozenset(tag_array)
+        if tag_set in self.__selection_cache:
+            self.__selection_hits += 1
+            self.__selection_cache.move_to_end(tag_set)
+            selected = self.__selection_cache[tag_set]
+        else:
+            self.__selection_misses += 1
+            selected = None
+            # Check if tags match any renaming filter and take the first that
+            # does (because priority), skipping filters that cannot match
+            for position in self.__filter_index.candidates(tag_set,
+                                                           tag_groups):
+                index, compiled_filter = self.__decision_table[position]
+                if check_against_filter(tag_set, compiled_filter, tag_groups):
+                    selected = index
+                    break
+            self.__selection_cache[tag_set] = selected
+            if len(self.__selection_cache) > SELECTION_CACHE_SIZE:
+                self.__selection_cache.popitem(last=False)
+        if selected is None:
+            return False
+        return self.__renaming_schemas[selected]['format_string']
+
+    def get_selection_stats(self):
+        """
+        Returns statistics on the cache of renaming schemas selected by
+        find_format_string().
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        dict
+            A dictionary of the form:
+                {
+                    'hits': int,
+                        Number of selections made from the cache
+                    'misses': int,
+                        Number of selections made by checking filters
+                    'cached': int
+                        Number of tag sets currently in the cache
+                }
+        """
+        return {'hits': self.__selection_hits,
+                'misses': self.__selection_misses,
+                'cached': len(self.__selection_cache)}
+
+    def name_file(self, file, tag_groups, force_name=False,
+                  force_fail_bad=False):
+        """
+        Takes a single file and determines its name without /ITER| operators
+        (the first phase of determine_names()).  This depends only on the file
+        and the schema, so may be done for files in any order.
+
+        Parameters
+        ----------
+        file: AutotagicalFile
+            An AutotagicalFile object, representing the file to be named.
+        tag_groups: AutotagicalGroups
+            An AutotagicalGroups object representing known tag groups.
+        force_name: bool (False by default)
+            Whether to try to rename files that do not match the unnamed
+            pattern.
+        force_fail_bad: bool (False by default)
+            Whether a manually named file (being named because of force_name)
+            not matching any naming schema should be considered a failure to
+            name the file.
+
+        Returns
+        -------
+        None or (FormatTemplate, str)
+            None if the file is not to be renamed (its 'rename_failed'
+            attribute will have been set), otherwise the template it matched
+            and the name produced without /ITER| operators.
+        """
+        # First, see if it's been manually named
+        unnamed = self.check_if_unnamed(file.name + file.extension)
+        if force_name or unnamed:
+            # If it's unnamed or we're force naming, then try to rename it
+            # Find the right renaming schema
+            format_string = self.find_format_string(file.tag_set, tag_groups)
+
+            if not format_string:
+                if not unnamed and not force_fail_bad:
+                    # File was manually named, and while it couldn't be
+                    # renamed, that's okay
+                    logging.info('Skipped renaming of manually-named file:\n'
+                                 '%s', file.original_path)
+                    file.rename_failed = False
+                    return None
+                # Otherwise, couldn't name file and that's bad
+                logging.warning('File did not match any renaming schema:\n%s',
+                                file.raw_name)
+                file.rename_failed = True
+                return None
+
+            # If the file did match a schema, try renaming without /ITER|
+            template = compile_format_string(format_string)
+            return (template, template.render(file, tag_groups))
+
+        # If we got here, then file was manually named
+        logging.info('Skipped renaming of manually-named file:\n%s',
+                     file.original_path)
+        file.rename_failed = False
+        return None
+
+    def __assign_name(self, file, template, iterless_name, tag_groups):
+        """
+        Names a file, invoking /ITER| operators if its name has been produced
+        before (the second phase of determine_names()).  Files must be passed
+        in the order that occurrences should be numbered in.
+
+        Parameters
+        ----------
+        file: AutotagicalFile
+            An AutotagicalFile object, representing the file to be named.
+        template: FormatTemplate
+            The template the file matched, as returned by name_file().
+        iterless_name: str
+            The name produced without /ITER| operators, as returned by
+            name_file().
+        tag_groups: AutotagicalGroups
+            An AutotagicalGroups object representing known tag groups.
+
+        Returns
+        -------
+        None
+        """
+        # Append file path so as to ensure no needless invocation of iter
+        produced = str(file.dest_folder) + iterless_name
+
+        # Check if file name has been produced before
+        if produced not in self.__produced_names:
+            # First time, remember the name
+            file.output_name = iterless_name
+            file.rename_failed = False
+            logging.debug('Scheduling file:\n%s\nto be renamed to:\n%s\nThis '
+                          'is the first time this name has been scheduled.',
+                          file.raw_name, iterless_name)
+            self.__produced_names[produced] = {
+                'first_occurrence': file.original_path,
+                'first_file': file,
+                'occurrences': 1
+            }
+            return
+
+        # A file named first by a previous run (and being processed again,
+        # e.g. because it changed) is not a duplicate of itself, so keeps the
+        # name it was given then
+        produced_name = self.__produced_names[produced]
+        if 'first_file' not in produced_name and \
+           produced_name['first_occurrence'] is not None and \
+           os.path.abspath(produced_name['first_occurrence']) == \
+           os.path.abspath(file.original_path):
+            file.output_name = template.render(file, tag_groups, 1) \
+                if produced_name['occurrences'] > 1 else iterless_name
+            file.rename_failed = False
+            logging.debug('Scheduling file:\n%s\nto be renamed to:\n%s\nIt '
+                          'was given this name by a previous run.',
+                          file.raw_name, file.output_name)
+            if produced_name['occurrences'] == 1:
+                produced_name['first_file'] = file
+            return
+
+        # If here, then duplicated name found.  Need to rename original if
+        # first time (names restored from a previous run have no file to
+        # rename)
+        logging.debug('Duplicate file name: %s  Invoking ITER operator.',
+                      iterless_name)
+        orig_file = self.__produced_names[produced].get('first_file')
+        if self.__produced_names[produced]['occurrences'] == 1 and \
+           orig_file is not None:
+            logging.debug('First duplicate; scheduling rename of first '
+                          'occurrence.')
+            # Rename with invoked iter operators
+            orig_file.output_name = template.render(orig_file, tag_groups, 1)
+            logging.debug('Due to dupe, file to be named: %s now scheduled '
+                          'for: %s', iterless_name, orig_file.output_name)
+
+        # Increment number of times we've seen the name
+        self.__produced_names[produced]['occurrences'] += 1
+        # Name current file with iter now
+        iter_name = template.render(
+            file, tag_groups, self.__produced_names[produced]['occurrences'])
+        file.output_name = iter_name
+        file.rename_failed = False
+        logging.debug('Scheduling file:\n%s\nto be renamed to:\n%s',
+                      file.raw_name, iter_name)
 
     # pylint: disable=too-many-arguments
     def determine_names(self, file_list, tag_groups, force_name=False,
-                        force_fail_bad=False, clear_occurrences=False):
+                        force_fail_bad=False, clear_occurrences=False,
+                        iter_order='scan'):
         """
         Takes a list of files and processes how they should be renamed
         according to loaded schema.
 
+        Naming happens in two phases.  First, every file is named without
+        /ITER| operators, independently of every other file.  Then, files that
+        were given the same name are numbered for /ITER| operators, in the
+        order given by iter_order, so that numbering need not depend on the
+        order files were found in.
+
         Parameters
         ----------
         file_list: list of AutotagicalFile
@@ -444,6 +1034,11 @@ class AutotagicalNamer:
         clear_occurrences: bool (False by default)
             Whether to reset produced file names before the run (resetting iter
             operators).
+        iter_order: str ('scan' by default)
+            The order to number files with the same name in for /ITER|
+            operators, one of ITER_ORDERS: 'scan' (the order of file_list),
+            'path' (by original path), or 'mtime' (by modification time, then
+            original path).
 
         Returns
         -------
@@ -453,105 +1048,251 @@ class AutotagicalNamer:
             attributes will have been set properly.
         """
 
-        # Initialize list of files to return
-        return_list = []
-
         # Wipe produceed file names, if told to, to reset iter operators
         if clear_occurrences:
             self.__produced_names = dict()
 
-        # Iterate through files
+        # First phase: name every file without /ITER| operators, grouping
+        # files that produce the same name
+        return_list = []
+        named = dict()
         for file in file_list:
-            # First, see if it's been manually named
-            unnamed = self.check_if_unnamed(file.name + file.extension)
-            if force_name or unnamed:
-                # If it's unnamed or we're force naming, then try to rename it
-                # Find the right renaming schema
-                format_string = self.find_format_string(file.tag_array,
-                                                        tag_groups)
-
-                if not format_string:
-                    if not unnamed and not force_fail_bad:
-                        # File was manually named, and while it couldn't be
-                        # renamed, that's okay
-                        logging.info('Skipped renaming of manually-named '
-                                     'file:\n%s',
-                                     file.original_path)
-                        file.rename_failed = False
-                        return_list.append(file)
-                        continue
-                    # Otherwise, couldn't name file and that's bad
-                    logging.warning('File did not match any renaming '
-                                    'schema:\n%s', file.raw_name)
-                    file.rename_failed = True
-                    return_list.append(file)
-                    continue
-
-                # If the file did match a schema, try renaming without /ITER|
-                # first
-                iterless_name = substitute_operators(
-                    strip_iters(format_string), file, tag_groups)
-
-                # Append file path so as to ensure no needless invocation of
-                # iter
-                produced = str(file.dest_folder) + iterless_name
-
-                # Check if file name has been produced before
-                if produced not in self.__produced_names:
-                    # First time, remember the name
-                    file.output_name = iterless_name
-                    file.rename_failed = False
-                    return_list.append(file)
-                    logging.debug('Scheduling file:\n%s\nto be renamed to:\n'
-                                  '%s\nThis is the first time this name has '
-                                  'been scheduled.', file.raw_name,
-                                  iterless_name)
-                    self.__produced_names[produced] = {
-                        'first_occurrence': file.original_path,
-                        'occurrences': 1
-                    }
-                    continue
-
-                # If here, then duplicated name found.  Need to rename original
-                # if first time
-                logging.debug('Duplicate file name: %s  Invoking ITER '
-                              'operator.', iterless_name)
-                if self.__produced_names[produced]['occurrences'] == 1:
-                    logging.debug('First duplicate; scheduling rename of first'
-                                  ' occurrence.')
-                    for orig_file in return_list:
-                        # Find the first example
-                        if orig_file.original_path == \
-                           self.__produced_names[produced]['first_occurrence']:
-                            # Rename with invoked iter operators
-                            orig_file.output_name = \
-                                substitute_operators(
-                                    evaluate_iters(format_string, 1),
-                                    orig_file, tag_groups)
-                            logging.debug('Due to dupe, file to be named: %s'
-                                          ' now scheduled for: %s',
-                                          iterless_name, orig_file.output_name)
-                            break
-
-                # Increment number of times we've seen the name
-                self.__produced_names[produced]['occurrences'] += 1
-                # Name current file with iter now
-                iter_name = substitute_operators(
-                    evaluate_iters(
-                        format_string,
-                        self.__produced_names[produced]['occurrences']),
-                    file, tag_groups)
-                file.output_name = iter_name
+            return_list.append(file)
+            result = self.name_file(file, tag_groups, force_name,
+                                    force_fail_bad)
+            if result is not None:
+                named.setdefault(str(file.dest_folder) + result[1], []) \
+                    .append((file, result[0], result[1]))
+
+        # Second phase: number files with the same name in a stable order
+        self.assign_names(named, tag_groups, iter_order)
+
+        logging.debug('Renaming schema selection cache: %s',
+                      str(self.get_selection_stats()))
+        return return_list
+
+    def assign_names(self, named, tag_groups, iter_order='scan'):
+        """
+        Names files grouped by the name they produced without /ITER|
+        operators, numbering files with the same name in the order given by
+        iter_order (the second phase of determine_names()).
+
+        Parameters
+        ----------
+        named: dict
+            A dictionary with produced names (destination folder plus name
+            without /ITER| operators) as keys and lists of (file, template,
+            iterless_name) tuples as values, in scan order.  template and
+            iterless_name are as returned by name_file().
+        tag_groups: AutotagicalGroups
+            An AutotagicalGroups object representing known tag groups.
+        iter_order: str ('scan' by default)
+            The order to number files with the same name in for /ITER|
+            operators, one of ITER_ORDERS.
+
+        Returns
+        -------
+        None
+        """
+        sort_key = self.__iter_sort_key(iter_order)
+        for group in named.values():
+            if sort_key is not None and len(group) > 1:
+                group.sort(key=lambda named_file: sort_key(named_file[0]))
+            for file, template, iterless_name in group:
+                self.__assign_name(file, template, iterless_name, tag_groups)
+
+    # pylint: disable=too-many-arguments
+    def stream_names(self, files, tag_groups, force_name=False,
+                     force_fail_bad=False, iter_order='scan',
+                     window=STREAM_WINDOW):
+        """
+        Takes files one at a time and yields them once it is determined how
+        they should be renamed, so that files may be streamed.
+
+        A file that is yielded is never renamed again, so files whose names
+        have /ITER| operators are held back (up to window of them) in case
+        another file is given the same name.  Once too many are held, the
+        files with the name that was held longest are numbered (in the order
+        given by iter_order) and yielded.  A file given the same name after
+        that is numbered on from them, without renaming the first, just as
+        for names restored from a previous run.  With a large enough window,
+        names are the same as those given by determine_names(), except that
+        names given by format strings without /ITER| operators are not
+        remembered, so a later file given the same name by one with them is
+        not numbered after them.  Only names given by format strings with
+        /ITER| operators are remembered, so memory grows with the number of
+        those alone.
+
+        Parameters
+        ----------
+        files: iterable of AutotagicalFile
+            AutotagicalFile objects, each representing a file to be named.
+        tag_groups: AutotagicalGroups
+            An AutotagicalGroups object representing known tag groups.
+        force_name: bool (False by default)
+            Whether to try to rename files that do not match the unnamed
+            pattern.
+        force_fail_bad: bool (False by default)
+            Whether a manually named file (being named because of force_name)
+            not matching any naming schema should be considered a failure to
+            name the file.
+        iter_order: str ('scan' by default)
+            The order to number held back files with the same name in for
+            /ITER| operators, one of ITER_ORDERS.
+        window: int (default STREAM_WINDOW)
+            The maximum number of files to hold back.
+
+        Returns
+        -------
+        generator of AutotagicalFile
+            The same files, though not necessarily in order.  The
+            'rename_failed' and 'output_name' attributes will have been set
+            properly.
+        """
+        # Held back files, grouped by produced name (held longest first)
+        held = OrderedDict()
+        held_count = 0
+        for file in files:
+            result = self.name_file(file, tag_groups, force_name,
+                                    force_fail_bad)
+            if result is None:
+                yield file
+                continue
+            template, iterless_name = result
+            produced = str(file.dest_folder) + iterless_name
+
+            if produced in held:
+                held[produced].append((file, template, iterless_name))
+                held_count += 1
+            elif produced in self.__produced_names:
+                # Earlier files with this name are already final, so no need
+                # to wait
+                yield from self.__release(produced, [(file, template,
+                                                      iterless_name)],
+                                          tag_groups, iter_order)
+                continue
+            elif template.iter_nodes == template.nodes:
+                # The name would not change anyway, so it is neither held nor
+                # remembered (which would grow with every file)
+                file.output_name = iterless_name
                 file.rename_failed = False
-                return_list.append(file)
-                logging.debug('Scheduling file:\n%s\nto be renamed to:\n%s',
-                              file.raw_name, iter_name)
+                yield file
                 continue
+            else:
+                held[produced] = [(file, template, iterless_name)]
+                held_count += 1
+
+            # Release the name held longest once too many files are held
+            while held_count > window:
+                produced, group = held.popitem(last=False)
+                held_count -= len(group)
+                yield from self.__release(produced, group, tag_groups,
+                                          iter_order)
+
+        # No more files, so all held names are final
+        while held:
+            produced, group = held.popitem(last=False)
+            yield from self.__release(produced, group, tag_groups, iter_order)
+
+        logging.debug('Renaming schema selection cache: %s',
+                      str(self.get_selection_stats()))
+
+    def __release(self, produced, group, tag_groups, iter_order):
+        """
+        Names a group of held back files with the same name and returns them,
+        forgetting the first, as files that are released are never renamed
+        again.
 
-            # If we got here, then file was manually named
-            logging.info('Skipped renaming of manually-named file:\n%s',
-                         file.original_path)
-            file.rename_failed = False
-            return_list.append(file)
+        Parameters
+        ----------
+        produced: str
+            The name produced by the files (destination folder plus name
+            without /ITER| operators).
+        group: list of (AutotagicalFile, FormatTemplate, str)
+            The files, in scan order, with the template and name without
+            /ITER| operators returned by name_file().
+        tag_groups: AutotagicalGroups
+            An AutotagicalGroups object representing known tag groups.
+        iter_order: str
+            The order to number files in for /ITER| operators, one of
+            ITER_ORDERS.
 
-        return return_list
+        Returns
+        -------
+        list of AutotagicalFile
+            The named files.
+        """
+        self.assign_names({produced: group}, tag_groups, iter_order)
+        self.__produced_names[produced].pop('first_file', None)
+        return [file for file, _, _ in group]
+
+    @staticmethod
+    def __iter_sort_key(iter_order):
+        """
+        Returns the key to sort files with the same name by for /ITER|
+        operators.
+
+        Parameters
+        ----------
+        iter_order: str
+            One of ITER_ORDERS.
+
+        Returns
+        -------
+        None or function
+            None for the 'scan' order (files are left in order), otherwise a
+            function taking an AutotagicalFile and returning its sort key.
+        """
+        if iter_order == 'path':
+            return lambda file: file.original_path
+        if iter_order == 'mtime':
+            def mtime_key(file):
+                try:
+                    mtime = os.stat(file.original_path).st_mtime_ns
+                except OSError:
+                    mtime = 0
+                return (mtime, file.original_path)
+            return mtime_key
+        if iter_order != 'scan':
+            logging.warning('Unknown /ITER| order: %s  Numbering in scan '
+                            'order.', iter_order)
+        return None
+
+    def get_produced_names(self):
+        """
+        Returns the file names produced so far (for /ITER| operators).
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        dict
+            A dictionary of the form of __produced_names, without the
+            'first_file' references (so that it may be saved).
+        """
+        return {produced: {'occurrences': produced_name['occurrences'],
+                           'first_occurrence':
+                               produced_name['first_occurrence']}
+                for produced, produced_name in self.__produced_names.items()}
+
+    def restore_produced_names(self, produced_names):
+        """
+        Restores file names produced by a previous run (e.g. from an
+        AutotagicalIndex), so that /ITER| operators continue from them.  Files
+        named in previous runs are not renamed again, even if a new file is
+        given the same name.  A file named first by a previous run that is
+        named again keeps the name it was given.
+
+        Parameters
+        ----------
+        produced_names: dict
+            A dictionary of the form returned by get_produced_names().
+
+        Returns
+        -------
+        None
+        """
+        for produced, produced_name in produced_names.items():
+            self.__produced_names[produced] = dict(produced_name)
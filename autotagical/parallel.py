@@ -0,0 +1,305 @@
+"""
+====================
+autotagical.parallel
+====================
+
+This is *autotagical.parallel*.
+
+It contains the functions used to determine destinations and names of files in
+a pool of worker processes, so that large numbers of files may be classified
+using every core.
+
+---------
+Constants
+---------
+EVALUATION_CHUNK_SIZE
+    The default number of files sent to a worker process at a time.
+_WORKER_STATE
+    The schema, tag groups, and settings of a worker process, set once by
+    _init_worker().  Not intended for use outside of this module.
+
+---------
+Functions
+---------
+_init_worker(movement_schema, renaming_schemas, unnamed_patterns, tag_groups,
+             options, known_tags, log_queue, log_level)
+    Initializes a worker process with everything needed to evaluate files.
+_evaluate_chunk(chunk)
+    Determines the destination and (iterless) name of a chunk of files in a
+    worker process.
+_chunks(file_list, chunk_size)
+    Yields successive chunks of a list of files.
+_merge_chunk(chunk, future, named, rename_only)
+    Copies the results of evaluating a chunk in a worker back to the files in
+    the main process.
+evaluate_files(file_list, settings, namer=None, processes=2,
+               chunk_size=EVALUATION_CHUNK_SIZE)
+    Determines destinations and names of files in a pool of worker processes.
+"""
+
+import logging
+import multiprocessing
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from logging.handlers import QueueHandler, QueueListener
+from autotagical.moving import compile_movement_schema, \
+                                determine_destination
+from autotagical.naming import AutotagicalNamer, compile_format_string
+from autotagical.schema import SchemaError
+from autotagical.tags import TAG_DICTIONARY
+
+EVALUATION_CHUNK_SIZE = 1024
+
+# Set once per worker process by _init_worker()
+_WORKER_STATE = dict()
+
+
+# pylint: disable=too-many-arguments
+def _init_worker(movement_schema, renaming_schemas, unnamed_patterns,
+                 tag_groups, options, known_tags, log_queue, log_level):
+    """
+    Initializes a worker process with everything needed to evaluate files, so
+    that it is only sent to each worker once.  The worker's TAG_DICTIONARY is
+    restored from the main process, so that tag IDs (of files and tag groups)
+    agree.  Its logging is sent to the main process, to be handled there by
+    the same handlers, whether the worker was forked or spawned.
+
+    Parameters
+    ----------
+    movement_schema: list
+        A list of movement schema in the form provided by
+        AutotagicalSchema.movement_schema, or None to not determine
+        destinations.
+    renaming_schemas: list
+        A list of the sort stored in AutotagicalSchema.renaming_schemas, or
+        None to not determine names.
+    unnamed_patterns: list
+        A list of the sort stored in AutotagicalSchema.unnamed_patterns.
+    tag_groups: AutotagicalGroups
+        An AutotagicalGroups object representing known tag groups.
+    options: dict
+        The 'force_name' and 'force_fail_bad' arguments to
+        AutotagicalNamer.name_file().
+    known_tags: list of str
+        The tags known to the main process, as returned by
+        TAG_DICTIONARY.get_state().
+    log_queue: multiprocessing.Queue
+        The queue to send log records to the main process through.
+    log_level: int
+        The level of the main process's root logger.
+
+    Returns
+    -------
+    None
+    """
+    # Replace any handlers inherited by forking, so records are only handled
+    # once, in the main process
+    root_logger = logging.getLogger()
+    root_logger.handlers = [QueueHandler(log_queue)]
+    root_logger.setLevel(log_level)
+    TAG_DICTIONARY.restore_state(known_tags)
+    # Compiled once per worker, rather than for every chunk (it was already
+    # checked by the main process)
+    _WORKER_STATE['movement_schema'] = \
+        compile_movement_schema(movement_schema) \
+        if movement_schema is not None else None
+    _WORKER_STATE['namer'] = AutotagicalNamer(renaming_schemas,
+                                              unnamed_patterns) \
+        if renaming_schemas is not None else None
+    _WORKER_STATE['tag_groups'] = tag_groups
+    _WORKER_STATE['options'] = options
+
+
+def _evaluate_chunk(chunk):
+    """
+    Determines the destination and name without /ITER| operators of a chunk
+    of files in a worker process.  This is everything but /ITER| numbering,
+    which depends on other files.
+
+    Parameters
+    ----------
+    chunk: list of AutotagicalFile
+        The files to evaluate (copies of those in the main process).
+
+    Returns
+    -------
+    list of tuple
+        For each file, in order, a tuple of (dest_folder, move_failed,
+        rename_failed, format_string, iterless_name).  format_string and
+        iterless_name are None if the file is not to be renamed.  Raises a
+        SchemaError if evaluating a file would exit.
+    """
+    movement_schema = _WORKER_STATE['movement_schema']
+    namer = _WORKER_STATE['namer']
+    tag_groups = _WORKER_STATE['tag_groups']
+    options = _WORKER_STATE['options']
+    results = []
+    try:
+        if movement_schema is not None:
+            determine_destination(chunk, movement_schema, tag_groups)
+        for file in chunk:
+            named = namer.name_file(file, tag_groups, options['force_name'],
+                                    options['force_fail_bad']) \
+                if namer is not None else None
+            results.append((file.dest_folder, file.move_failed,
+                            file.rename_failed,
+                            named[0].source if named is not None else None,
+                            named[1] if named is not None else None))
+    except SystemExit:
+        # The problem was logged, but only the main process may exit
+        raise SchemaError('Bad format string encountered in a worker '
+                          'process!') from None
+    return results
+
+
+def _chunks(file_list, chunk_size):
+    """
+    Yields successive chunks of a list of files.
+
+    Parameters
+    ----------
+    file_list: list of AutotagicalFile
+        The files to split.
+    chunk_size: int
+        The (maximum) number of files per chunk.
+
+    Returns
+    -------
+    generator of list of AutotagicalFile
+        The chunks, in order.
+    """
+    for start in range(0, len(file_list), chunk_size):
+        yield file_list[start:start + chunk_size]
+
+
+def _merge_chunk(chunk, future, named, rename_only):
+    """
+    Copies the results of evaluating a chunk in a worker back to the files in
+    the main process, and groups files to be renamed by the name they
+    produced.
+
+    Parameters
+    ----------
+    chunk: list of AutotagicalFile
+        The files evaluated, in the main process.
+    future: concurrent.futures.Future
+        The future of _evaluate_chunk() for the chunk.
+    named: dict
+        The files to be renamed so far, in the form taken by
+        AutotagicalNamer.assign_names().  Updated in place.
+    rename_only: bool
+        Whether destinations were not determined.
+
+    Returns
+    -------
+    None
+    """
+    for file, (dest_folder, move_failed, rename_failed, format_string,
+               iterless_name) in zip(chunk, future.result()):
+        if not rename_only:
+            file.dest_folder = dest_folder
+            file.move_failed = move_failed
+        file.rename_failed = rename_failed
+        if format_string is not None:
+            named.setdefault(str(file.dest_folder) + iterless_name, []) \
+                .append((file, compile_format_string(format_string),
+                         iterless_name))
+
+
+def evaluate_files(file_list, settings, namer=None, processes=2,
+                   chunk_size=EVALUATION_CHUNK_SIZE):
+    """
+    Determines destinations and names of files in a pool of worker processes,
+    equivalently to determine_destination() followed by
+    AutotagicalNamer.determine_names().  The schema and tag groups are sent to
+    each worker once, then files are sent in chunks.  Results are merged in
+    the order of file_list, so /ITER| numbering is the same as if done
+    serially.
+
+    Parameters
+    ----------
+    file_list: list of AutotagicalFile
+        A list of AutotagicalFile objects, each representing a file to be
+        moved and/or renamed.
+    settings: AutotagicalSettings
+        The settings for the run.  Its schema, tag_groups, rename_only,
+        force_name, force_name_fail_bad, and iter_order are used.
+    namer: AutotagicalNamer (default None)
+        The namer to name files with (and to number /ITER| operators with), or
+        None to not rename files.
+    processes: int (default 2)
+        Number of worker processes to use.
+    chunk_size: int (default EVALUATION_CHUNK_SIZE)
+        Number of files to send to a worker at a time.
+
+    Returns
+    -------
+    list of AutotagicalFile
+        A list of AutotagicalFile objects, each representing a file (will
+        include all original files).  The 'move_failed' and 'dest_folder'
+        (unless only renaming) and 'rename_failed' and 'output_name' (if a
+        namer was given) attributes will have been set properly.  Exits if a
+        worker process found a problem with the schema.
+    """
+    rename_only = getattr(settings, 'rename_only', False)
+    options = {'force_name': getattr(settings, 'force_name', False),
+               'force_fail_bad': getattr(settings, 'force_name_fail_bad',
+                                         False)}
+    # Check the movement schema here, so that problems are only reported once
+    if not rename_only:
+        try:
+            compile_movement_schema(settings.schema.movement_schema,
+                                    settings.tag_groups)
+        except SchemaError as err:
+            logging.error('Aborting due to a problem with the schema: %s',
+                          str(err))
+            sys.exit()
+
+    # Log records from workers are handled by this process's handlers
+    context = multiprocessing.get_context()
+    log_queue = context.Queue()
+    root_logger = logging.getLogger()
+    listener = QueueListener(log_queue, *(root_logger.handlers or
+                                          [logging.lastResort]),
+                             respect_handler_level=True)
+    initargs = (None if rename_only else settings.schema.movement_schema,
+                settings.schema.renaming_schemas if namer is not None
+                else None,
+                settings.schema.unnamed_patterns, settings.tag_groups,
+                options, TAG_DICTIONARY.get_state(), log_queue,
+                root_logger.getEffectiveLevel())
+
+    named = dict()
+    listener.start()
+    try:
+        with ProcessPoolExecutor(max_workers=processes, mp_context=context,
+                                 initializer=_init_worker,
+                                 initargs=initargs) as executor:
+            # Keep a bounded number of chunks in flight, merging results in
+            # order
+            in_flight = deque()
+            chunks = _chunks(file_list, chunk_size)
+            for chunk in chunks:
+                in_flight.append((chunk, executor.submit(_evaluate_chunk,
+                                                         chunk)))
+                if len(in_flight) < 2 * processes:
+                    continue
+                _merge_chunk(*in_flight.popleft(), named, rename_only)
+            while in_flight:
+                _merge_chunk(*in_flight.popleft(), named, rename_only)
+    except SchemaError as err:
+        logging.error('Aborting due to a problem with the schema: %s',
+                      str(err))
+        sys.exit()
+    finally:
+        listener.stop()
+
+    # Number /ITER| operators in the main process, since it depends on every
+    # file
+    if namer is not None:
+        namer.assign_names(named, settings.tag_groups,
+                           getattr(settings, 'iter_order', 'scan'))
+    logging.debug('Evaluated %s files in %s processes.', str(len(file_list)),
+                  str(processes))
+    return list(file_list)
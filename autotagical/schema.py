@@ -12,6 +12,11 @@ Functions
 ---------
 _repr_filter_tree(filter, indent=0)
     Pretty print a schema level.  Only used for debugging.
+_check_filter(check_filter)
+    Compiles a filter and warns of anything malformed in it.
+_compile_filter_tree(filter_levels)
+    Compiles and indexes the filters of a list of filter levels and all their
+    sublevels.
 
 Classes
 -------
@@ -27,6 +32,7 @@ import sys
 import os
 from jsonschema import validate, ValidationError
 from packaging import version
+from autotagical.filtering import compile_filter, index_filters
 
 
 def _repr_filter_tree(filter_level, indent=0):
@@ -60,13 +66,67 @@ def _repr_filter_tree(filter_level, indent=0):
     return to_return
 
 
+def _check_filter(check_filter):
+    """
+    Compiles a filter and warns of anything malformed in it.  Filters are only
+    checked against files when they could match, so a malformed filter would
+    otherwise only be reported (by a FilterError) if a file reached it.
+
+    Parameters
+    ----------
+    check_filter: list of str
+        The filter to check.
+
+    Returns
+    -------
+    CompiledFilter
+        The compiled filter.
+    """
+    compiled = compile_filter(check_filter)
+    if not compiled.condition_sets:
+        logging.warning('Malformed filter in schema: Completely empty!')
+    for condition_set in compiled.condition_sets:
+        if not condition_set.conditions:
+            logging.warning('Malformed condition set in schema filter %s: '
+                            'Completely empty!', str(list(compiled.source)))
+        for condition in condition_set.conditions:
+            if not condition.wildcard and condition.tag is None and \
+               condition.tag_group is None:
+                logging.warning('Malformed condition in schema filter %s: '
+                                '"%s"', str(list(compiled.source)),
+                                condition.source)
+    return compiled
+
+
+def _compile_filter_tree(filter_levels):
+    """
+    Compiles and indexes the filters of a list of filter levels and all their
+    sublevels, so that they need not be parsed while processing files.
+
+    Parameters
+    ----------
+    filter_levels: list of dict
+        The filter levels to compile.  Each should have keys 'filter' and
+        'sublevels'.
+
+    Returns
+    -------
+    None
+    """
+    index_filters([_check_filter(filter_level['filter']) for filter_level
+                   in filter_levels])
+    for filter_level in filter_levels:
+        _compile_filter_tree(filter_level['sublevels'])
+
+
 class SchemaError(Exception):
     """
     Exception raised when a serious problem is discovered in a schema file.
     """
 
     def __init__(self, message):
-        super().__init__()
+        # Passed on so that it survives pickling (e.g. from worker processes)
+        super().__init__(message)
         self.message = message
 
     def __str__(self):
@@ -299,6 +359,11 @@ class AutotagicalSchema:
         self.renaming_schemas += json_input['renaming_schemas']
         self.movement_schema += json_input['movement_schema']
 
+        # Compile and index all filters once now, rather than for every file
+        index_filters([_check_filter(renaming_schema['filter']) for
+                       renaming_schema in self.renaming_schemas])
+        _compile_filter_tree(self.movement_schema)
+
         logging.debug('Loaded schema:\nTag Formats: %s\nUnnamed Patterns:  %s'
                       '\nRenaming Schemas: %s\nMovement Schema: %s',
                       str(self.tag_formats), str(self.unnamed_patterns),
@@ -16,6 +16,8 @@ _init_logging(verbose, no_warn, debug, log_file=None, overwrite_log=False)
     honored.
 _flatten_input_list(input_list)
     Flattens a list of the form returned by argparse.
+_folder_contains(folder, path)
+    Determines whether a path is a folder or inside it.
 _load_files(input_list, load_function):
     Loads all provided files with the provided function (while appending)
 _check_for_config_file(folder_list):
@@ -35,7 +37,9 @@ import re
 import os
 import sys
 import logging
+from autotagical.file_handler import OUTPUT_STRATEGIES, COPY_CHUNK_SIZE
 from autotagical.groups import AutotagicalGroups
+from autotagical.naming import AutotagicalNamer
 from autotagical.schema import AutotagicalSchema
 from autotagical import __version__ as version
 
@@ -108,6 +112,27 @@ def _flatten_input_list(input_list):
     return [item[0] for item in input_list]
 
 
+def _folder_contains(folder, path):
+    """
+    Determines whether a path is a folder or inside it (following symlinks).
+
+    Parameters
+    ----------
+    folder: str
+        Path to the folder.
+    path: str
+        The path to check.
+
+    Returns
+    -------
+    bool
+        True if path is folder or inside it, False otherwise.
+    """
+    return os.path.join(os.path.normcase(os.path.realpath(path)), '') \
+        .startswith(os.path.join(os.path.normcase(os.path.realpath(folder)),
+                                 ''))
+
+
 def _load_files(input_list, load_function):
     """
     Loads all provided files with the provided function (while appending)
@@ -172,6 +197,8 @@ class AutotagicalSettings:  # pylint: disable=R0902, R0903
         prompt).
     copy: bool
         Whether to copy files from input folder or move them out of it.
+    copy_chunk_size: int
+        Maximum number of bytes to copy at a time when copying files.
     force_move: bool
         Whether to move files that could not be renamed.
     force_name: bool
@@ -181,21 +208,41 @@ class AutotagicalSettings:  # pylint: disable=R0902, R0903
         name.
     ignore_files: list of str
         List of paths to files containing patterns of files to ignore.
+    incremental: bool
+        Whether to keep an index of processed files in the first output
+        folder, and only process new or changed files.
     input_folders: list of str
         List of paths to directories to parse files from.
+    iter_order: str
+        The order to number files with the same name in for /ITER| operators,
+        one of AutotagicalNamer.ITER_ORDERS ('scan', 'path', or 'mtime').
     move_only: bool
         Whether to only move files, not rename them.
+    move_threads: int
+        Number of threads to transfer files to output folders with
+        concurrently.
     output_folders: list of str
         List of paths to directories to output files to.  Files will be copied
         to each.
+    output_strategy: str
+        How to produce files in output folders after the first, one of
+        OUTPUT_STRATEGIES ('copy', 'hardlink', 'reflink', or 'symlink').
+    processes: int
+        Number of worker processes to determine destinations and names of
+        files in.
     process_hidden: bool
         Whether to include hidden files and directories (those begining with
         ".") in input
         folders.
     recurse: bool
         Whether to descend into subdirectories looking for input files.
+    stream: bool
+        Whether to move each file as soon as its destination and name are
+        determined, rather than loading all files first.
     rename_only: bool
         Whether to only rename files, not move them.
+    scan_threads: int
+        Number of threads to list input directories with concurrently.
     schema: AutotagicalSchema
         A representation of loaded movement/renaming schemas.
     silence_windows: bool
@@ -230,7 +277,11 @@ class AutotagicalSettings:  # pylint: disable=R0902, R0903
         self.input_folders = []
         self.ignore_files = []
         self.recurse = True
+        self.scan_threads = 1
         self.output_folders = []
+        self.output_strategy = 'copy'
+        self.move_threads = 1
+        self.copy_chunk_size = COPY_CHUNK_SIZE
         self.tag_groups = None
         self.schema = None
         self.all_match_root = True
@@ -243,6 +294,10 @@ class AutotagicalSettings:  # pylint: disable=R0902, R0903
         self.trial_run = True
         self.silence_windows = True
         self.force_name_fail_bad = True
+        self.incremental = True
+        self.iter_order = 'scan'
+        self.processes = 1
+        self.stream = True
         # Unsafe options initialize to False, because cannot be set via config
         self.clobber = False
         self.answer_yes = False
@@ -356,6 +411,17 @@ class AutotagicalSettings:  # pylint: disable=R0902, R0903
             self.recurse = False
         logging.debug('Recursive input: %s', str(self.recurse))
 
+        # Use scan threads from CL if got them, otherwise file.
+        if cl_args.scan_threads is not None:
+            self.scan_threads = cl_args.scan_threads
+        elif file_args.scan_threads is not None:
+            self.scan_threads = file_args.scan_threads
+        if self.scan_threads < 1:
+            logging.warning('Cannot scan input folders with fewer than 1 '
+                            'thread.  Ignoring --scanthreads.')
+            self.scan_threads = 1
+        logging.debug('Input scan threads: %s', str(self.scan_threads))
+
         # Output Arguments
         if cl_args.output_folders:
             self.output_folders = _flatten_input_list(cl_args.output_folders)
@@ -377,6 +443,37 @@ class AutotagicalSettings:  # pylint: disable=R0902, R0903
             sys.exit()
         logging.debug('Output folders: %s', str(self.output_folders))
 
+        # Use output strategy from CL if got it, otherwise file.
+        if cl_args.output_strategy:
+            self.output_strategy = cl_args.output_strategy
+        elif file_args.output_strategy:
+            self.output_strategy = file_args.output_strategy
+        logging.debug('Output strategy: %s', self.output_strategy)
+
+        # Use move threads from CL if got them, otherwise file.
+        if cl_args.move_threads is not None:
+            self.move_threads = cl_args.move_threads
+        elif file_args.move_threads is not None:
+            self.move_threads = file_args.move_threads
+        if self.move_threads < 1:
+            logging.warning('Cannot move files with fewer than 1 thread.  '
+                            'Ignoring --movethreads.')
+            self.move_threads = 1
+        logging.debug('Output move threads: %s', str(self.move_threads))
+
+        # Use copy chunk size from CL if got it, otherwise file.
+        if cl_args.copy_chunk_size is not None:
+            chunk_size = cl_args.copy_chunk_size
+        else:
+            chunk_size = file_args.copy_chunk_size
+        if chunk_size is not None:
+            if chunk_size < 1:
+                logging.warning('Cannot copy files in chunks smaller than 1 '
+                                'KiB.  Ignoring --chunksize.')
+            else:
+                self.copy_chunk_size = chunk_size * 1024
+        logging.debug('Copy chunk size: %s bytes', str(self.copy_chunk_size))
+
         # Schema Arguments
         self.tag_groups = AutotagicalGroups()
         if cl_args.tag_group_files:
@@ -479,6 +576,46 @@ class AutotagicalSettings:  # pylint: disable=R0902, R0903
         logging.debug('Force name failure counts as failure: %s',
                       str(self.force_name_fail_bad))
 
+        # Incremental unless neither set
+        if not cl_args.incremental and not file_args.incremental:
+            self.incremental = False
+        logging.debug('Incremental run: %s', str(self.incremental))
+
+        # Use /ITER| order from CL if got it, otherwise file.
+        if cl_args.iter_order:
+            self.iter_order = cl_args.iter_order
+        elif file_args.iter_order:
+            self.iter_order = file_args.iter_order
+        logging.debug('/ITER| order: %s', self.iter_order)
+
+        # Use processes from CL if got them, otherwise file.
+        if cl_args.processes is not None:
+            self.processes = cl_args.processes
+        elif file_args.processes is not None:
+            self.processes = file_args.processes
+        if self.processes < 1:
+            logging.warning('Cannot evaluate files in fewer than 1 process.  '
+                            'Ignoring --processes.')
+            self.processes = 1
+        logging.debug('Evaluation processes: %s', str(self.processes))
+
+        # Stream unless neither set
+        if not cl_args.stream and not file_args.stream:
+            self.stream = False
+        elif self.recurse and any(_folder_contains(in_folder, out_folder)
+                                  for in_folder in self.input_folders
+                                  for out_folder in self.output_folders):
+            # Moved files could be found again while still scanning
+            logging.warning('Received the --stream option but an output '
+                            'folder is inside a recursed input folder.  '
+                            'Ignoring it.')
+            self.stream = False
+        elif self.processes > 1:
+            logging.warning('Received the --processes option but streaming '
+                            '(--stream).  Ignoring it.')
+            self.processes = 1
+        logging.debug('Stream files: %s', str(self.stream))
+
         # Trial run unless neither set
         if not cl_args.trial_run and not file_args.trial_run:
             self.trial_run = False
@@ -564,6 +701,12 @@ class AutotagicalSettings:  # pylint: disable=R0902, R0903
                                 action='store_true',
                                 help='Load files recursively from input '
                                      'folders, i.e. descend into subfolders.')
+        input_args.add_argument('--scanthreads', dest='scan_threads',
+                                action='store', type=int,
+                                metavar='<threads>',
+                                help='Number of threads to list input folders '
+                                     'with concurrently (default 1).  Useful '
+                                     'for slow (e.g. network) filesystems.')
         # Output args
         output_args = parser.add_argument_group('Output Options')
         output_args.add_argument('-o', '--output', dest='output_folders',
@@ -577,6 +720,25 @@ class AutotagicalSettings:  # pylint: disable=R0902, R0903
                                  help='Organize files in place (i.e. use the '
                                       'first input folder for output).  Often '
                                       'used with -R.')
+        output_args.add_argument('--outputstrategy', dest='output_strategy',
+                                 action='store', choices=OUTPUT_STRATEGIES,
+                                 help='How to output files to all but the '
+                                      'first output folder: copy (default), '
+                                      'hardlink, reflink (copy-on-write '
+                                      'clone), or symlink (to the first).  '
+                                      'Falls back to copy if not possible.')
+        output_args.add_argument('--movethreads', dest='move_threads',
+                                 action='store', type=int,
+                                 metavar='<threads>',
+                                 help='Number of threads to copy/move files '
+                                      'with concurrently (default 1).  '
+                                      'Prompts still happen in order.')
+        output_args.add_argument('--chunksize', dest='copy_chunk_size',
+                                 action='store', type=int, metavar='<KiB>',
+                                 help='Maximum amount of data to copy at a '
+                                      'time when copying files, in KiB '
+                                      '(default ' +
+                                      str(COPY_CHUNK_SIZE // 1024) + ').')
         # Schema args
         schema_args = parser.add_argument_group('Schema Options')
         schema_args.add_argument('-g', '--groups', dest='tag_group_files',
@@ -624,6 +786,20 @@ class AutotagicalSettings:  # pylint: disable=R0902, R0903
                                         'considered a failure to name the file'
                                         ' (and it should not be moved unless '
                                         '-M is set).')
+        function_args.add_argument('--incremental', dest='incremental',
+                                   action='store_true',
+                                   help='Keep an index of processed files in '
+                                        'the first output folder and only '
+                                        'process new or changed files on '
+                                        'later runs.')
+        function_args.add_argument('--iterorder', dest='iter_order',
+                                   action='store',
+                                   choices=AutotagicalNamer.ITER_ORDERS,
+                                   help='Order to number files given the same '
+                                        'name in for /ITER| operators: scan '
+                                        '(order found, default), path (by '
+                                        'original path), or mtime (by '
+                                        'modification time).')
         function_args.add_argument('-k', '--keep', dest='copy',
                                    action='store_true',
                                    help='Keep original files by copying rather'
@@ -644,6 +820,19 @@ class AutotagicalSettings:  # pylint: disable=R0902, R0903
                                    action='store_true',
                                    help='Try to rename all files, not just '
                                         'those matching an unnamed filter.')
+        function_args.add_argument('--processes', dest='processes',
+                                   action='store', type=int,
+                                   metavar='<processes>',
+                                   help='Number of processes to determine '
+                                        'destinations and names of files in '
+                                        '(default 1).  Useful for very large '
+                                        'numbers of files.')
+        function_args.add_argument('--stream', dest='stream',
+                                   action='store_true',
+                                   help='Move each file as soon as its '
+                                        'destination and name are determined,'
+                                        ' rather than loading all files first.'
+                                        '  Useful for huge numbers of files.')
         function_args.add_argument('-t', '--trial', dest='trial_run',
                                    action='store_true',
                                    help='Do not actually move or rename files,'
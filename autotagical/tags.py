@@ -0,0 +1,270 @@
+"""
+================
+autotagical.tags
+================
+
+This is *autotagical.tags*.
+
+It contains the run-wide dictionary of tags, which gives each distinct tag a
+small integer ID and a single canonical string, so that the many files
+sharing a tag share one copy of it and tags can be compared by ID.
+
+---------
+Constants
+---------
+TAG_DICTIONARY
+    The dictionary of tags shared by the file handler, tag groups, and
+    filters for the run.
+
+-------
+Classes
+-------
+TagDictionary
+    Assigns each distinct tag an integer ID and keeps one canonical copy of
+    it.
+TagSet
+    A frozenset of tags which also carries their IDs.
+
+---------
+Functions
+---------
+tag_ids(tags)
+    Returns the IDs of a collection of tags.
+"""
+
+
+class TagDictionary:
+    """
+    Assigns each distinct tag an integer ID (in the order first seen) and
+    keeps one canonical copy of it, so that tags need only be stored once.
+
+    Instance Attributes
+    -------------------
+    __ids: dict
+        A dictionary with tags as keys and their IDs as values.
+    __tags: list of str
+        The canonical copy of each tag, indexed by ID.
+    __tag_sets: dict
+        A dictionary with frozensets of tags as keys and the TagSet shared by
+        all files with exactly those tags as values.
+
+    Methods
+    -------
+    __init__()
+        Constructor, initializes an empty dictionary.
+    __len__()
+        Returns the number of distinct tags known.
+    __contains__(tag)
+        Determines whether a tag has been assigned an ID.
+    id_of(tag)
+        Returns the ID of a tag, assigning one if it is new.
+    tag_of(tag_id)
+        Returns the canonical copy of the tag with an ID.
+    canonical(tag)
+        Returns the canonical copy of a tag, remembering it if it is new.
+    tag_set(tags)
+        Returns the (shared) TagSet of a collection of tags.
+    get_state()
+        Returns the tags known, in order of ID.
+    restore_state(tags)
+        Replaces the tags known (e.g. with those of another process).
+    """
+
+    def __init__(self):
+        """
+        Constructor, initializes an empty dictionary.
+        """
+        self.__ids = dict()
+        self.__tags = []
+        self.__tag_sets = dict()
+
+    def __len__(self):
+        """
+        Returns the number of distinct tags known.
+        """
+        return len(self.__tags)
+
+    def __contains__(self, tag):
+        """
+        Determines whether a tag has been assigned an ID.
+        """
+        return tag in self.__ids
+
+    def id_of(self, tag):
+        """
+        Returns the ID of a tag, assigning one if it is new.
+
+        Parameters
+        ----------
+        tag: str
+            The tag.
+
+        Returns
+        -------
+        int
+            The ID of the tag.
+        """
+        tag_id = self.__ids.get(tag)
+        if tag_id is None:
+            tag_id = len(self.__tags)
+            self.__ids[tag] = tag_id
+            self.__tags.append(tag)
+        return tag_id
+
+    def tag_of(self, tag_id):
+        """
+        Returns the canonical copy of the tag with an ID.
+
+        Parameters
+        ----------
+        tag_id: int
+            The ID of the tag.
+
+        Returns
+        -------
+        str
+            The tag.
+        """
+        return self.__tags[tag_id]
+
+    def canonical(self, tag):
+        """
+        Returns the canonical copy of a tag, remembering it if it is new.
+
+        Parameters
+        ----------
+        tag: str
+            The tag.
+
+        Returns
+        -------
+        str
+            A string equal to tag, shared by every use of the tag.
+        """
+        return self.__tags[self.id_of(tag)]
+
+    def tag_set(self, tags):
+        """
+        Returns the TagSet of a collection of tags.  It is shared by every
+        collection of exactly the same tags, as many files have the same tags.
+
+        Parameters
+        ----------
+        tags: iterable of str
+            The tags.
+
+        Returns
+        -------
+        TagSet
+            The tags (canonical copies) and their IDs.
+        """
+        key = frozenset(tags)
+        tag_set = self.__tag_sets.get(key)
+        if tag_set is None:
+            tag_set = TagSet([self.canonical(tag) for tag in key],
+                             [self.__ids[tag] for tag in key])
+            self.__tag_sets[tag_set] = tag_set
+        return tag_set
+
+    def get_state(self):
+        """
+        Returns the tags known, in order of ID, in the form taken by
+        restore_state().
+
+        Returns
+        -------
+        list of str
+            The tags.
+        """
+        return list(self.__tags)
+
+    def restore_state(self, tags):
+        """
+        Replaces the tags known (e.g. with those of another process), so that
+        IDs agree with those assigned elsewhere.
+
+        Parameters
+        ----------
+        tags: list of str
+            The tags, in order of ID, as returned by get_state().
+
+        Returns
+        -------
+        None
+        """
+        self.__tags = list(tags)
+        self.__ids = {tag: tag_id for tag_id, tag in enumerate(self.__tags)}
+        self.__tag_sets = dict()
+
+
+# The dictionary of tags for the run
+TAG_DICTIONARY = TagDictionary()
+
+
+class TagSet(frozenset):
+    """
+    A frozenset of (canonical) tags which also carries their IDs in
+    TAG_DICTIONARY.  It is equal to (and hashes the same as) a frozenset of
+    the same tags, so may be used anywhere one is.  Produce these with
+    TagDictionary.tag_set().
+
+    Instance Attributes
+    -------------------
+    ids: frozenset of int
+        The IDs of the tags.
+
+    Methods
+    -------
+    __new__(tags, ids)
+        Constructor.
+    __reduce__()
+        Pickles the tags along with their IDs.
+    """
+    __slots__ = ('ids',)
+
+    def __new__(cls, tags, ids):
+        """
+        Constructor.
+
+        Parameters
+        ----------
+        tags: iterable of str
+            The tags.
+        ids: iterable of int
+            The IDs of the tags.
+
+        Returns
+        -------
+        TagSet
+        """
+        tag_set = super().__new__(cls, tags)
+        tag_set.ids = frozenset(ids)
+        return tag_set
+
+    def __reduce__(self):
+        """
+        Pickles the tags along with their IDs (e.g. to send files to worker
+        processes).
+        """
+        return (TagSet, (tuple(self), tuple(self.ids)))
+
+
+def tag_ids(tags):
+    """
+    Returns the IDs of a collection of tags, which are carried by a TagSet
+    (e.g. AutotagicalFile.tag_set) and otherwise looked up.
+
+    Parameters
+    ----------
+    tags: TagSet, frozenset of str, or list of str
+        The tags.
+
+    Returns
+    -------
+    frozenset of int
+        The IDs of the tags.
+    """
+    if isinstance(tags, TagSet):
+        return tags.ids
+    return frozenset(TAG_DICTIONARY.id_of(tag) for tag in tags)
+
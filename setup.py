@@ -35,6 +35,18 @@ class Doctest(test):
         if results.failed:
             raise Exception(results)
         print('Okay!')
+        results = run_tests('index')
+        if results.failed:
+            raise Exception(results)
+        print('Okay!')
+        results = run_tests('parallel')
+        if results.failed:
+            raise Exception(results)
+        print('Okay!')
+        results = run_tests('tags')
+        if results.failed:
+            raise Exception(results)
+        print('Okay!')
         sys.path[0] = old_path
         super().run()
         print('All tests passed!')
@@ -66,6 +78,9 @@ setuptools.setup(
         'jsonschema>=3',
         'packaging'
     ],
+    extras_require={
+        'batch': ['numpy']
+    },
     classifiers=[
         "Development Status :: 5 - Production/Stable",
         "Environment :: Console",